@@ -0,0 +1,130 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+
+class LRUCache:
+    """Ограниченный по размеру кэш процесса с временем жизни записей."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = time.monotonic() + (timeout or self.timeout)
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+
+_local_cache = None
+_local_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """
+    Кэш токенов: общий кэш Django из TOKEN_CACHE_ALIAS или LRU процесса.
+    """
+    global _local_cache
+    if settings.TOKEN_CACHE_ALIAS:
+        return caches[settings.TOKEN_CACHE_ALIAS]
+    if _local_cache is None:
+        with _local_cache_lock:
+            if _local_cache is None:
+                _local_cache = LRUCache(settings.TOKEN_CACHE_SIZE,
+                                        settings.TOKEN_CACHE_TIMEOUT)
+    return _local_cache
+
+
+def token_cache_key(key):
+    # Сам токен в ключ не попадает: ключи общего кэша видны снаружи.
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def forget_tokens(keys):
+    keys = [token_cache_key(key) for key in keys]
+    if keys:
+        get_token_cache().delete_many(keys)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Выход через djoser token/logout и любое удаление токена."""
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    """
+    Деактивация, смена пароля (UserViewSet.set_password) и правка
+    профиля: закэшированный пользователь устарел.
+    """
+    if created:
+        return
+    if sender.auth_token.is_cached(instance):
+        # request.user: токен уже загружен аутентификацией, без запроса.
+        forget_tokens([instance.auth_token.key])
+    else:
+        forget_tokens(Token.objects.filter(user=instance).values_list(
+            'key', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса токена и пользователя к базе на
+    каждый запрос: пара берётся из кэша токенов на TOKEN_CACHE_TIMEOUT.
+
+    С LRU процесса удаление токена и изменение пользователя видит сразу
+    только свой воркер, остальные — по истечении TOKEN_CACHE_TIMEOUT
+    (по умолчанию несколько секунд); с общим бэкендом кэша сброс сразу
+    виден всем воркерам. Изменения через QuerySet.update() сигналов не
+    вызывают и тоже ждут истечения записи.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cache_key = token_cache_key(key)
+        entry = cache.get(cache_key)
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, (user, token),
+                      settings.TOKEN_CACHE_TIMEOUT)
+        else:
+            user, token = entry
+        # Копии: view может менять request.user, а запись общая для
+        # потоков воркера.
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
@@ -0,0 +1,133 @@
+import logging
+import os
+import traceback
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('api.budgets')
+
+STACK_DEPTH = 8
+SQL_LENGTH = 300
+WRAPPER_FILES = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('budgets.py', 'instrumentation.py', 'metrics.py')}
+FRAMEWORK_PATH = f'{os.sep}rest_framework{os.sep}'
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Запрос или блок выполнил больше SQL, чем разрешено."""
+
+
+def get_budget(view, action):
+    """Бюджет SQL для action из атрибута query_budget класса view."""
+    return (getattr(view, 'query_budget', None) or {}).get(action)
+
+
+def project_stack():
+    """
+    Кадры стека из кода проекта без обёрток вокруг SQL и запроса
+    (этот модуль, метрики, инструментирование) и самый внутренний кадр
+    DRF — поле или сериализатор, из которого пришёл запрос.
+    """
+    root = str(settings.BASE_DIR)
+    stack = [frame for frame in traceback.extract_stack()
+             if frame.filename not in WRAPPER_FILES]
+    keep = [frame for frame in stack
+            if frame.filename.startswith(root)
+            and 'site-packages' not in frame.filename][-STACK_DEPTH:]
+    framework = [frame for frame in stack
+                 if FRAMEWORK_PATH in frame.filename][-1:]
+    # В порядке вызова: кадр DRF может быть и внешним к кадрам проекта.
+    return [frame for frame in stack
+            if any(frame is kept for kept in keep + framework)]
+
+
+class QueryRecorder:
+    """SQL блока вместе с местом вызова в коде проекта."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __len__(self):
+        return len(self.queries)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, project_stack()))
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def duplicates(self):
+        """Повторы одинакового SQL: [(текст, число, стеки), ...]."""
+        found = {}
+        for sql, stack in self.queries:
+            found.setdefault(sql, []).append(stack)
+        return sorted(((sql, len(stacks), stacks)
+                       for sql, stacks in found.items() if len(stacks) > 1),
+                      key=lambda item: -item[1])
+
+    def report(self, label, budget):
+        lines = [f'{label}: {len(self)} SQL при бюджете {budget}.']
+        for sql, count, stacks in self.duplicates():
+            lines.append(f'{count} раз: {" ".join(sql.split())[:SQL_LENGTH]}')
+            lines += [f'    {line.rstrip()}' for line
+                      in traceback.format_list(stacks[0])]
+        return '\n'.join(lines)
+
+
+@contextmanager
+def query_budget(budget, label='Блок'):
+    """
+    Помощник для проверок: блок не должен выполнять больше budget SQL.
+
+        with query_budget(get_budget(RecipeViewSet, 'list')):
+            client.get('/api/recipes/recipes/')
+    """
+    recorder = QueryRecorder()
+    with recorder.record():
+        yield recorder
+    if len(recorder) > budget:
+        raise QueryBudgetExceeded(recorder.report(label, budget))
+
+
+class QueryBudgetMiddleware:
+    """
+    Проверка бюджетов SQL для view с атрибутом query_budget
+    ({action: число запросов}). QUERY_BUDGET_MODE: пусто — выключено,
+    'warn' — предупреждение в лог api.budgets, 'strict' — запрос
+    завершается ошибкой QueryBudgetExceeded с повторами SQL и стеками.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = settings.QUERY_BUDGET_MODE
+        if not mode:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        label, budget = getattr(request, 'query_budget', (None, None))
+        if budget is None or len(recorder) <= budget:
+            return response
+        report = recorder.report(label, budget)
+        if mode == 'strict':
+            raise QueryBudgetExceeded(report)
+        logger.warning(report)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'cls', None)
+        action = getattr(view_func, 'actions', {}).get(request.method.lower())
+        if view is not None and action:
+            request.query_budget = (f'{view.__name__}.{action}',
+                                    get_budget(view, action))
+        return None
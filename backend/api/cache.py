@@ -0,0 +1,109 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from recipes.models import Ingredient, ReferenceVersion, Tag
+from rest_framework.response import Response
+
+
+def get_reference_cache():
+    return caches[settings.REFERENCE_CACHE_ALIAS]
+
+
+def stamp_key(model):
+    return f'reference:{model._meta.label_lower}:stamp'
+
+
+def get_stamp(model):
+    """
+    Версия и время последнего изменения справочника. Читается из
+    ReferenceVersion и держится в кэше REFERENCE_STAMP_TIMEOUT секунд:
+    изменения из других процессов видны не позже чем через это время.
+    """
+    cache = get_reference_cache()
+    stamp = cache.get(stamp_key(model))
+    if stamp is None:
+        row, _ = ReferenceVersion.objects.get_or_create(
+            name=model._meta.label_lower)
+        stamp = (str(row.version), int(row.changed_at.timestamp()))
+        cache.set(stamp_key(model), stamp, settings.REFERENCE_STAMP_TIMEOUT)
+    return stamp
+
+
+def invalidate_reference(model):
+    """Сбрасывает закэшированные ответы справочника во всех процессах."""
+    name = model._meta.label_lower
+    updated = ReferenceVersion.objects.filter(name=name).update(
+        version=F('version') + 1, changed_at=timezone.now())
+    if not updated:
+        ReferenceVersion.objects.get_or_create(
+            name=name, defaults={'version': 1})
+    transaction.on_commit(
+        lambda: get_reference_cache().delete(stamp_key(model)))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def reference_changed(sender, **kwargs):
+    invalidate_reference(sender)
+
+
+class ReferenceCacheMixin:
+    """
+    Кэширует ответы справочников (теги, ингредиенты) и отвечает 304
+    на условные запросы с If-None-Match / If-Modified-Since.
+    Параметры запроса, от которых зависит ответ, перечисляются в
+    cache_query_params.
+    """
+    cache_query_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request, version):
+        # Только параметры, которые view читает: остальные не плодят
+        # записи. Хеш — ключ допустим для любого бэкенда (memcached не
+        # принимает пробелы и ключи длиннее 250 символов).
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        query = [(param, request.GET.getlist(param))
+                 for param in self.cache_query_params]
+        digest = hashlib.md5(json.dumps(
+            [lookup, query], ensure_ascii=False).encode()).hexdigest()
+        return (f'reference:{self.queryset.model._meta.label_lower}:'
+                f'{version}:{self.action}:{digest}')
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        version, last_modified = get_stamp(self.queryset.model)
+        cache = get_reference_cache()
+        key = self.get_cache_key(request, version)
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = json.dumps(response.data, sort_keys=True,
+                                 ensure_ascii=False)
+            entry = (response.data,
+                     quote_etag(hashlib.md5(content.encode()).hexdigest()))
+            cache.set(key, entry, settings.REFERENCE_CACHE_TIMEOUT)
+        data, etag = entry
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+        response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -1,11 +1,25 @@
+from django.conf import settings
+from django.db.models import Case, Exists, F, OuterRef, When
 from django_filters.rest_framework import FilterSet, filters
-from recipes.models import Recipe, Tag
+from recipes.models import Favorite, Recipe, RecipeTags, ShoppingList, Tag
+from recipes.search import search_recipes
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from .search import get_ingredient_index
 
 
 class RecipeFilter(FilterSet):
+    """
+    Фильтры ленты рецептов. Теги проверяются по битовой маске рецепта,
+    остальные связанные таблицы — коррелированными EXISTS-подзапросами:
+    без JOIN рецепты не дублируются и DISTINCT не нужен.
+    """
     tags = filters.ModelMultipleChoiceFilter(field_name='tags__slug',
                                              to_field_name='slug',
-                                             queryset=Tag.objects.all())
+                                             queryset=Tag.objects.all(),
+                                             method='tags_filter')
     is_favorited = filters.BooleanFilter(
         method='is_favorited_filter')
     is_in_shopping_cart = filters.BooleanFilter(
@@ -15,14 +29,67 @@ class RecipeFilter(FilterSet):
         model = Recipe
         fields = ('tags', 'author',)
 
+    def tags_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        tag_ids = [tag.pk for tag in value]
+        if Recipe.tags_fit_mask(tag_ids):
+            # Проверка маски не требует обращения к таблице связей.
+            return queryset.alias(
+                tag_hits=F('tag_mask').bitand(Recipe.make_tag_mask(tag_ids))
+            ).filter(tag_hits__gt=0)
+        return queryset.filter(Exists(RecipeTags.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value)))
+
     def is_favorited_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorite_recipe__user=user)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
         return queryset
 
     def is_in_shopping_cart_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shopping_recipe__user=user)
+            return queryset.filter(Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
         return queryset
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+    Без явной сортировки (ordering) самые релевантные идут первыми,
+    поэтому результаты листаются по номеру страницы: курсор упорядочен
+    по дате публикации и релевантность бы потерял.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        cursor_param = getattr(view.paginator, 'cursor_query_param', None)
+        if cursor_param in request.query_params:
+            raise ValidationError({cursor_param: (
+                f'Результаты поиска листаются по номеру страницы: '
+                f'{cursor_param} нельзя указывать вместе с '
+                f'{self.search_param}.')})
+        return search_recipes(queryset, query).order_by(
+            '-search_rank', '-pub_date', '-id')
+
+
+class IngredientSearchFilter(BaseFilterBackend):
+    """Поиск ингредиентов по индексу названий с ранжированием."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(api_settings.SEARCH_PARAM, '')
+        if not query.strip():
+            return queryset
+        ids = get_ingredient_index().search(
+            query, settings.INGREDIENT_SEARCH_LIMIT)
+        if not ids:
+            return queryset.none()
+        return queryset.filter(pk__in=ids).order_by(
+            Case(*[When(pk=pk, then=position)
+                   for position, pk in enumerate(ids)]))
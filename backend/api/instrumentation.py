@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+import django
+import rest_framework
+from django.conf import settings
+from django.db import connections
+from rest_framework.fields import Field
+
+logger = logging.getLogger('api.timing')
+
+LIBRARY_DIRS = tuple(os.path.dirname(package.__file__)
+                     for package in (django, rest_framework))
+FINGERPRINT_LENGTH = 300
+
+_local = threading.local()
+
+
+def current_stats():
+    return getattr(_local, 'stats', None)
+
+
+def serializer_origin(frame):
+    """
+    Метод сериализатора, из которого пришёл запрос: ближайший кадр
+    стека с self-полем DRF из кода проекта, иначе поле внутри DRF.
+    """
+    fallback = None
+    while frame is not None:
+        owner = frame.f_locals.get('self')
+        if isinstance(owner, Field):
+            name = frame.f_code.co_name
+            if not frame.f_code.co_filename.startswith(LIBRARY_DIRS):
+                return f'{type(owner).__name__}.{name}'
+            if fallback is None and owner.parent is not None:
+                fallback = (f'{type(owner.parent).__name__}.'
+                            f'{owner.field_name}')
+        frame = frame.f_back
+    return fallback
+
+
+class RequestStats:
+    """Счётчики одного запроса: SQL, время по этапам, повторы SQL."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.stages = {}
+        self.statements = {}
+        self.origins = {}
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            # Одинаковый текст SQL с разными параметрами — признак N+1;
+            # стек разбирается только на первом повторе.
+            count = self.statements.get(sql, 0) + 1
+            self.statements[sql] = count
+            if count == 2:
+                self.origins[sql] = serializer_origin(sys._getframe(1))
+
+    def add(self, stage, duration):
+        self.stages[stage] = self.stages.get(stage, 0.0) + duration
+
+    def repeated(self):
+        threshold = settings.REQUEST_TIMING_REPEATS
+        return [
+            {'sql': ' '.join(sql.split())[:FINGERPRINT_LENGTH],
+             'count': count, 'origin': self.origins.get(sql)}
+            for sql, count in sorted(self.statements.items(),
+                                     key=lambda item: -item[1])
+            if count >= threshold]
+
+    def timings(self):
+        """Длительности этапов в миллисекундах."""
+        timings = {'db': self.db_time * 1000}
+        timings.update(
+            (stage, duration * 1000)
+            for stage, duration in self.stages.items())
+        timings['total'] = (time.perf_counter() - self.started) * 1000
+        return timings
+
+
+@contextmanager
+def stage(name):
+    """Учитывает время блока как этап name текущего запроса."""
+    stats = current_stats()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add(name, time.perf_counter() - start)
+
+
+def timed(serializer):
+    """Сериализатор, время вывода которого попадает в этап serialize."""
+    if current_stats() is None:
+        return serializer
+    to_representation = serializer.to_representation
+
+    def timed_to_representation(instance):
+        with stage('serialize'):
+            return to_representation(instance)
+
+    serializer.to_representation = timed_to_representation
+    return serializer
+
+
+class TimedRenderer:
+    """Обёртка рендерера ответа DRF, замеряющая этап render."""
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+
+    def __getattr__(self, name):
+        return getattr(self.renderer, name)
+
+    def render(self, *args, **kwargs):
+        with stage('render'):
+            return self.renderer.render(*args, **kwargs)
+
+
+class SerializerTimingMixin:
+    """Время сериализации ответов view для RequestTimingMiddleware."""
+
+    def get_serializer(self, *args, **kwargs):
+        return timed(super().get_serializer(*args, **kwargs))
+
+
+class RequestTimingMiddleware:
+    """
+    Замеры запроса: число и время SQL, сериализация, рендеринг, общее
+    время — по view и action DRF. Итог уходит в заголовок Server-Timing
+    и строкой JSON в лог api.timing, вместе с повторами одинакового SQL
+    и методом сериализатора, который их вызвал.
+
+    Замеряется доля запросов REQUEST_TIMING_SAMPLE_RATE, остальные
+    проходят без обёрток. SQL потоковых ответов (выгрузка корзины)
+    выполняется после выхода из middleware и в замеры не попадает.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+        stats = _local.stats = RequestStats()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.execute))
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        timings = stats.timings()
+        response['Server-Timing'] = ', '.join(
+            [f'db;desc="{stats.queries} queries";dur={timings["db"]:.2f}']
+            + [f'{name};dur={duration:.2f}'
+               for name, duration in timings.items() if name != 'db'])
+        logger.info(json.dumps({
+            'view': stats.view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.queries,
+            **{f'{name}_ms': round(duration, 2)
+               for name, duration in timings.items()},
+            'repeated': stats.repeated(),
+        }, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = current_stats()
+        if stats is None:
+            return None
+        view = getattr(view_func, 'cls', None)
+        if view is None:
+            stats.view = view_func.__name__
+            return None
+        action = getattr(view_func, 'actions', {}).get(
+            request.method.lower())
+        stats.view = f'{view.__name__}.{action}' if action else view.__name__
+        return None
+
+    def process_template_response(self, request, response):
+        renderer = getattr(response, 'accepted_renderer', None)
+        if current_stats() is not None and renderer is not None:
+            response.accepted_renderer = TimedRenderer(renderer)
+        return response
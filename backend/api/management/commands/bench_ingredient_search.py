@@ -0,0 +1,102 @@
+import csv
+import os
+import random
+import statistics
+import time
+
+from api.search import IngredientIndex
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Ingredient
+
+UNIT_SUFFIX = ' (bench)'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Сравнение задержек поиска ингредиентов: индекс и ORM '
+            '(name ILIKE). Данные вставляются в транзакции, которая '
+            'затем откатывается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=os.path.join('data', 'ingredients.csv'))
+        parser.add_argument('--synthetic', type=int, default=200_000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int,
+                            default=settings.INGREDIENT_SEARCH_LIMIT)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if Ingredient.objects.exists():
+            self.stdout.write(self.style.WARNING(
+                'В таблице уже есть ингредиенты, они попадут в замеры '
+                'индекса и ORM.'))
+        with open(options['path'], encoding='utf-8') as file:
+            rows = [(name, unit) for name, unit in csv.reader(file)]
+        rng = random.Random(options['seed'])
+        datasets = [('csv', rows)]
+        if options['synthetic']:
+            datasets.append(
+                ('synthetic', self.synthetic(rows, options['synthetic'], rng)))
+        for label, data in datasets:
+            queries = self.queries(data, options['queries'], rng)
+            try:
+                with transaction.atomic():
+                    # Своя единица измерения: строки не совпадают с уже
+                    # загруженными db_ingredients (unique_ingredient).
+                    Ingredient.objects.bulk_create(
+                        [Ingredient(name=name,
+                                    measurement_unit=f'{unit}{UNIT_SUFFIX}')
+                         for name, unit in data],
+                        batch_size=5000, ignore_conflicts=True)
+                    # id читаются из базы: bulk_create возвращает их не на
+                    # всех СУБД. Индекс и ORM ищут по одним и тем же строкам.
+                    index = IngredientIndex(
+                        Ingredient.objects.values_list('pk', 'name'))
+                    self.report(label, len(index), 'index', self.measure(
+                        lambda query: index.search(query, options['limit']),
+                        queries))
+                    self.report(label, len(index), 'orm', self.measure(
+                        lambda query: list(Ingredient.objects.filter(
+                            name__istartswith=query)[:options['limit']]),
+                        queries))
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def synthetic(self, rows, size, rng):
+        words = [word for name, _ in rows for word in name.split()]
+        return [(f'{rows[i % len(rows)][0]} {rng.choice(words)} {i}',
+                 rows[i % len(rows)][1]) for i in range(size)]
+
+    def queries(self, data, count, rng):
+        queries = []
+        for _ in range(count):
+            name = rng.choice(data)[0]
+            word = name.split()[0]
+            if rng.random() < 0.8 or len(word) < 4:
+                queries.append(name[:rng.randint(1, min(len(name), 6))])
+            else:
+                # Опечатка: соседние буквы первого слова переставлены.
+                i = rng.randrange(len(word) - 1)
+                queries.append(word[:i] + word[i + 1] + word[i] + word[i + 2:])
+        return queries
+
+    def measure(self, search, queries):
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def report(self, label, size, engine, timings):
+        percentiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f'{label:<10} {size:>8} строк  {engine:<6} '
+            f'p50={percentiles[49]:.3f} мс  p99={percentiles[98]:.3f} мс')
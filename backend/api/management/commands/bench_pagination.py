@@ -0,0 +1,70 @@
+import statistics
+import time
+
+from api.pagination import RecipePaginator
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Recipe
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Задержка выдачи глубокой страницы ленты рецептов: по номеру '
+            'страницы и по курсору. Рецепты создаются в транзакции, '
+            'которая затем откатывается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        page, limit = options['page'], options['limit']
+        try:
+            with transaction.atomic():
+                author = User.objects.create(username='bench_pagination',
+                                             email='bench@pagination.local')
+                Recipe.objects.bulk_create(
+                    [Recipe(author=author, name=f'Рецепт {i}', text='-',
+                            cooking_time=1)
+                     for i in range(options['recipes'])], batch_size=5000)
+                queryset = Recipe.objects.all()
+                boundary = queryset.order_by('-pub_date', '-id')[
+                    (page - 1) * limit - 1]
+                cursor = RecipePaginator().encode_cursor(
+                    [boundary.pub_date, boundary.id])
+                offset = self.measure(
+                    queryset, {'page': page, 'limit': limit},
+                    options['repeat'])
+                keyset = self.measure(
+                    queryset, {'cursor': cursor, 'limit': limit},
+                    options['repeat'])
+                if offset[1] != keyset[1]:
+                    self.stdout.write(self.style.ERROR(
+                        'Страницы не совпадают!'))
+                for label, (timings, _) in (('offset', offset),
+                                            ('cursor', keyset)):
+                    self.stdout.write(
+                        f'{label:<7} страница {page}: '
+                        f'p50={statistics.median(timings):.2f} мс  '
+                        f'max={max(timings):.2f} мс')
+                raise Rollback
+        except Rollback:
+            pass
+
+    def measure(self, queryset, params, repeat):
+        request = Request(APIRequestFactory().get('/', params))
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = [recipe.id for recipe in RecipePaginator()
+                      .paginate_queryset(queryset, request)]
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings, result
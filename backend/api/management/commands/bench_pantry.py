@@ -0,0 +1,56 @@
+import random
+import statistics
+import time
+
+from api.pantry import PantryIndex
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Задержка поиска рецептов по продуктам на синтетическом '
+            'индексе: популярность ингредиентов распределена по Ципфу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=500_000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--pantry', type=int, default=15,
+                            help='Продуктов в одном запросе.')
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=100)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        ingredient_ids = range(1, options['ingredients'] + 1)
+        weights = [1 / rank for rank in ingredient_ids]
+        rows = []
+        for recipe_id in range(1, options['recipes'] + 1):
+            for pk in set(random.choices(ingredient_ids, weights,
+                                         k=random.randint(5, 12))):
+                rows.append((recipe_id, pk))
+        started = time.perf_counter()
+        index = PantryIndex(rows)
+        self.stdout.write(
+            f'Индекс: {len(rows)} строк за '
+            f'{time.perf_counter() - started:.2f} с')
+        del rows
+        timings, found = [], []
+        for _ in range(options['repeat']):
+            pantry = random.choices(ingredient_ids, weights,
+                                    k=options['pantry'])
+            start = time.perf_counter()
+            ranking = index.search(pantry)
+            len(ranking)
+            ranking[:options['limit']]
+            timings.append((time.perf_counter() - start) * 1000)
+            found.append(len(ranking))
+        timings.sort()
+        self.stdout.write(
+            f'Поиск: p50={statistics.median(timings):.2f} мс  '
+            f'p95={timings[int(len(timings) * 0.95) - 1]:.2f} мс  '
+            f'max={timings[-1]:.2f} мс, '
+            f'в среднем {statistics.mean(found):.0f} рецептов')
+        start = time.perf_counter()
+        index.update({options['recipes'] // 2: list(ingredient_ids[:8])})
+        self.stdout.write(
+            f'Обновление рецепта: '
+            f'{(time.perf_counter() - start) * 1000:.2f} мс')
@@ -0,0 +1,119 @@
+import json
+import statistics
+import time
+
+from api.recipes.fast_read import recipe_rows, recipe_values
+from api.recipes.serializers import RecipeReadSerializer
+from api.renderers import FastJSONRenderer, orjson
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTags, Tag)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import Subscribe, User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Сериализация и рендеринг страницы рецептов: сериализаторы DRF '
+            'против строк values() и FastJSONRenderer. Ответы сверяются, '
+            'данные создаются в транзакции, которая затем откатывается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100,
+                            help='Рецептов на странице.')
+        parser.add_argument('--ingredients', type=int, default=8,
+                            help='Ингредиентов в рецепте.')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                request = self.prepare(options)
+                queryset = Recipe.objects.filter(
+                    author__username__startswith='bench_serializers'
+                ).defer('search_vector')
+                results = {}
+                for label, serialize, renderer in (
+                    ('drf', lambda: RecipeReadSerializer(
+                        queryset.with_related().with_user_flags(
+                            request.user), many=True,
+                        context={'request': request}).data,
+                     JSONRenderer()),
+                    ('fast', lambda: recipe_rows(
+                        recipe_values(queryset, request.user), request),
+                     FastJSONRenderer()),
+                ):
+                    results[label] = self.measure(
+                        serialize, renderer, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+        if json.loads(results['drf'][2]) != json.loads(results['fast'][2]):
+            raise CommandError('Ответы быстрого и обычного пути различаются.')
+        self.stdout.write(
+            f'orjson: {"да" if orjson else "нет"}, ответы совпадают')
+        for label, (serialize, render, _) in results.items():
+            self.stdout.write(
+                f'{label:<5} сериализация p50='
+                f'{statistics.median(serialize):.2f} мс  рендеринг p50='
+                f'{statistics.median(render):.2f} мс  всего p50='
+                f'{statistics.median(map(sum, zip(serialize, render))):.2f} '
+                f'мс')
+
+    def prepare(self, options):
+        """Страница рецептов разных авторов с тегами и ингредиентами."""
+        user = User.objects.create(username='bench_serializers',
+                                   email='bench@serializers.local')
+        User.objects.bulk_create(
+            [User(username=f'bench_serializers_{i}',
+                  email=f'bench{i}@serializers.local',
+                  first_name='Имя', last_name='Фамилия',
+                  avatar=f'users/bench{i}.png') for i in range(10)])
+        authors = list(User.objects.filter(
+            username__startswith='bench_serializers_'))
+        Tag.objects.bulk_create(
+            [Tag(name=f'bench тег {i}', slug=f'bench-serializers-{i}')
+             for i in range(4)])
+        tags = list(Tag.objects.filter(slug__startswith='bench-serializers'))
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=f'bench ингредиент {i}', measurement_unit='г')
+             for i in range(50)])
+        ingredients = list(Ingredient.objects.filter(
+            name__startswith='bench ингредиент'))
+        for i in range(options['recipes']):
+            recipe = Recipe.objects.create(
+                author=authors[i % len(authors)], name=f'Рецепт {i}',
+                text='Описание рецепта. ' * 20, cooking_time=i + 1,
+                image=f'recipes/images/bench{i}.png')
+            RecipeTags.objects.bulk_create(
+                [RecipeTags(recipe=recipe, tag=tags[(i + j) % len(tags)])
+                 for j in range(2)])
+            RecipeIngredient.objects.bulk_create(
+                [RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredients[(i + j) % len(ingredients)],
+                    amount=j + 1) for j in range(options['ingredients'])])
+            if i % 3 == 0:
+                Favorite.objects.create(user=user, recipe=recipe)
+        Subscribe.objects.bulk_create(
+            [Subscribe(user=user, author=author) for author in authors[::2]])
+        request = Request(APIRequestFactory().get('/api/recipes/recipes/'))
+        request.user = user
+        return request
+
+    def measure(self, serialize, renderer, repeat):
+        serialize_timings, render_timings = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = serialize()
+            middle = time.perf_counter()
+            content = renderer.render(data)
+            serialize_timings.append((middle - start) * 1000)
+            render_timings.append((time.perf_counter() - middle) * 1000)
+        return serialize_timings, render_timings, content
@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+
+from api.filters import RecipeFilter
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from recipes.models import Recipe, RecipeTags, Tag
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Задержка фильтра ленты по тегам: битовая маска против '
+            'EXISTS по таблице связей. Рецепты создаются в транзакции, '
+            'которая затем откатывается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        try:
+            with transaction.atomic():
+                self.fill(options['recipes'], options['tags'])
+                # Самый редкий тег — худший случай для первой страницы.
+                slug = Tag.objects.order_by('id').values_list(
+                    'slug', flat=True)[options['tags'] - 1]
+                tag_ids = list(Tag.objects.filter(slug=slug).values_list(
+                    'id', flat=True))
+                ordered = Recipe.objects.order_by('-pub_date', '-id')
+                masked = RecipeFilter(
+                    {'tags': [slug]}, queryset=ordered).qs
+                joined = ordered.filter(Exists(RecipeTags.objects.filter(
+                    recipe=OuterRef('pk'), tag__in=tag_ids)))
+                for label, queryset in (('mask', masked),
+                                        ('exists', joined)):
+                    page = self.measure(
+                        lambda: list(queryset.values_list('id', flat=True)[
+                            :options['limit']]), options['repeat'])
+                    count = self.measure(queryset.count, options['repeat'])
+                    self.stdout.write(
+                        f'{label:<7} страница: '
+                        f'p50={statistics.median(page):.2f} мс  '
+                        f'count: p50={statistics.median(count):.2f} мс')
+                raise Rollback
+        except Rollback:
+            pass
+
+    def fill(self, recipes, tags):
+        author = User.objects.create(username='bench_tag_filter',
+                                     email='bench@tag-filter.local')
+        for index in range(Tag.objects.count(), tags):
+            Tag.objects.create(name=f'Тег {index}', slug=f'bench-{index}')
+        tag_ids = list(Tag.objects.order_by('id').values_list(
+            'id', flat=True)[:tags])
+        # Теги по убыванию частоты: первый у половины рецептов и т. д.
+        weights = [1 / (rank + 1) for rank in range(len(tag_ids))]
+        chosen = [set(random.choices(tag_ids, weights, k=2))
+                  for _ in range(recipes)]
+        Recipe.objects.bulk_create(
+            [Recipe(author=author, name=f'Рецепт {i}', text='-',
+                    cooking_time=1, tag_mask=Recipe.make_tag_mask(ids))
+             for i, ids in enumerate(chosen)], batch_size=5000)
+        recipe_ids = Recipe.objects.filter(author=author).order_by(
+            'id').values_list('id', flat=True).iterator()
+        RecipeTags.objects.bulk_create(
+            (RecipeTags(recipe_id=recipe_id, tag_id=tag_id)
+             for recipe_id, ids in zip(recipe_ids, chosen)
+             for tag_id in ids), batch_size=5000)
+
+    def measure(self, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
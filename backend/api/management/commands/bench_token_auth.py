@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from api.authentication import CachedTokenAuthentication, forget_tokens
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+ENDPOINTS = ('/api/users/users/me/', '/api/recipes/tags/',
+             '/api/recipes/recipes/?limit=6',
+             '/api/users/users/subscriptions/')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Аутентификация по токену: TokenAuthentication DRF против '
+            'CachedTokenAuthentication — число SQL и время на запрос, '
+            'отдельно для authenticate() и для адресов API целиком '
+            '(кэш токенов сброшен перед каждым запросом и прогрет). '
+            'Пользователь создаётся в транзакции, которая затем '
+            'откатывается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        with override_settings(REQUEST_TIMING_SAMPLE_RATE=0,
+                               QUERY_BUDGET_MODE=''):
+            try:
+                with transaction.atomic():
+                    user = User.objects.create_user(
+                        username='bench_token_auth',
+                        email='bench@token.local', password='-')
+                    key = Token.objects.create(user=user).key
+                    self.authenticators(key, repeat)
+                    self.endpoints(key, repeat)
+                    raise Rollback
+            except Rollback:
+                pass
+            forget_tokens([key])
+
+    def report(self, label, queries, timings):
+        self.stdout.write(
+            f'{label:<44} SQL {statistics.mean(queries):.1f}  '
+            f'p50={statistics.median(timings):.3f} мс')
+
+    def measure(self, call, repeat, before=None):
+        queries, timings = [], []
+        for _ in range(repeat):
+            if before is not None:
+                before()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                call()
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+        return queries, timings
+
+    def authenticators(self, key, repeat):
+        request = Request(APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Token {key}'))
+        forget_tokens([key])
+        for label, authenticator in (
+                ('TokenAuthentication', TokenAuthentication()),
+                ('CachedTokenAuthentication', CachedTokenAuthentication())):
+            self.report(f'authenticate(): {label}', *self.measure(
+                lambda: authenticator.authenticate(request), repeat))
+
+    def endpoints(self, key, repeat):
+        client = Client(SERVER_NAME='localhost',
+                        HTTP_AUTHORIZATION=f'Token {key}')
+        for url in ENDPOINTS:
+            for label, before in (('без кэша', lambda: forget_tokens([key])),
+                                  ('с кэшем', None)):
+                self.report(f'{url} {label}', *self.measure(
+                    lambda: client.get(url), repeat, before))
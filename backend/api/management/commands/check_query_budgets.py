@@ -0,0 +1,228 @@
+import base64
+import json
+import tempfile
+
+from api.budgets import QueryBudgetExceeded, get_budget, query_budget
+from api.cache import invalidate_reference
+from api.recipes.views import (FeedViewSet, IngredientViewSet, RecipeViewSet,
+                               TagViewSet)
+from api.users.views import UserViewSet
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTags, ShoppingList, Tag)
+from recipes.search import update_search_index
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Subscribe, User
+
+PIXEL = 'data:image/gif;base64,' + base64.b64encode(
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04'
+    b'\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D'
+    b'\x01\x00;').decode()
+PASSWORD = 'Bench-password-1'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Проверяет бюджеты SQL (query_budget) всех адресов '
+            'api/recipes/urls.py и api/users/urls.py на реалистичных '
+            'данных. Данные создаются в транзакции, которая затем '
+            'откатывается; при превышении команда завершается ошибкой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=40)
+        parser.add_argument('--users', type=int, default=12)
+
+    def handle(self, *args, **options):
+        self.failures = []
+        with tempfile.TemporaryDirectory() as media, override_settings(
+                MEDIA_ROOT=media, QUERY_BUDGET_MODE='',
+                REQUEST_TIMING_SAMPLE_RATE=0):
+            try:
+                with transaction.atomic():
+                    self.check_endpoints(*self.seed(options))
+                    raise Rollback
+            except Rollback:
+                pass
+        # Кэш справочников мог запомнить откаченные теги и ингредиенты.
+        invalidate_reference(Tag)
+        invalidate_reference(Ingredient)
+        if self.failures:
+            raise CommandError(
+                'Превышены бюджеты: ' + ', '.join(self.failures))
+        self.stdout.write(self.style.SUCCESS('Все бюджеты соблюдены.'))
+
+    def seed(self, options):
+        users = [User.objects.create_user(
+            username=f'budget_{i}', email=f'budget{i}@budget.local',
+            password=PASSWORD, first_name='Имя', last_name='Фамилия')
+            for i in range(options['users'])]
+        Tag.objects.bulk_create(
+            [Tag(name=f'budget тег {i}', slug=f'budget-{i}')
+             for i in range(8)])
+        tags = list(Tag.objects.filter(slug__startswith='budget-'))
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=f'budget ингредиент {i}', measurement_unit='г')
+             for i in range(60)])
+        ingredients = list(Ingredient.objects.filter(
+            name__startswith='budget ингредиент'))
+        recipes = []
+        for i in range(options['recipes']):
+            recipe_tags = [tags[i % len(tags)], tags[(i + 3) % len(tags)]]
+            recipe = Recipe.objects.create(
+                author=users[1 + i % (len(users) - 1)], name=f'Рецепт {i}',
+                text='Описание рецепта.', cooking_time=10 + i,
+                tag_mask=Recipe.make_tag_mask(tag.pk for tag in recipe_tags))
+            RecipeTags.objects.bulk_create(
+                [RecipeTags(recipe=recipe, tag=tag) for tag in recipe_tags])
+            RecipeIngredient.objects.bulk_create(
+                [RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredients[(i * 7 + j) % len(ingredients)],
+                    amount=j + 1) for j in range(6)])
+            recipes.append(recipe)
+        update_search_index(recipe.pk for recipe in recipes)
+        user = users[0]
+        for recipe in recipes[::3]:
+            Favorite.objects.create(user=user, recipe=recipe)
+        for recipe in recipes[1:12:2]:
+            ShoppingList.objects.create(user=user, recipe=recipe)
+        for author in users[1:7]:
+            Subscribe.objects.create(user=user, author=author)
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        return client, users, ingredients, tags, recipes
+
+    def endpoints(self, users, ingredients, tags, recipes):
+        """(метод, адрес, тело, view, action) для всех маршрутов."""
+        recipe = recipes[0].pk
+        own_recipe = Recipe.objects.create(
+            author=users[0], name='Свой рецепт', text='Описание.',
+            cooking_time=5)
+        own = own_recipe.pk
+        # Изменение заменяет все строки рецепта, а не дописывает их.
+        RecipeTags.objects.bulk_create(
+            [RecipeTags(recipe_id=own, tag=tag) for tag in tags[2:4]])
+        RecipeIngredient.objects.bulk_create(
+            [RecipeIngredient(recipe_id=own, ingredient=ingredient, amount=1)
+             for ingredient in ingredients[10:16]])
+        # Самый дорогой путь записи, как на данных seed_benchmark: рецепт
+        # в чужих корзинах (пересчёт итогов), у автора есть подписчики
+        # (раскладка по лентам).
+        for reader in users[2:5]:
+            ShoppingList.objects.create(user=reader, recipe=own_recipe)
+        for follower in users[7:10]:
+            Subscribe.objects.create(user=follower, author=users[0])
+        new_recipe = {
+            'ingredients': [{'id': ingredients[i].pk, 'amount': i + 1}
+                            for i in range(6)],
+            'tags': [tags[0].pk, tags[1].pk], 'image': PIXEL,
+            'name': 'Новый рецепт', 'text': 'Описание.', 'cooking_time': 15,
+        }
+        lines = '\n'.join(json.dumps({
+            'name': f'Импорт {i}', 'text': 'Описание.', 'cooking_time': 5,
+            'tags': [tags[0].slug],
+            'ingredients': [{'id': ingredients[i].pk, 'amount': 1}]})
+            for i in range(5))
+        recipes_url = '/api/recipes/recipes/'
+        users_url = '/api/users/users/'
+        author = users[8].pk
+        return [
+            ('get', '/api/recipes/ingredients/?name=budget', None,
+             IngredientViewSet, 'list'),
+            ('get', f'/api/recipes/ingredients/{ingredients[0].pk}/', None,
+             IngredientViewSet, 'retrieve'),
+            ('get', '/api/recipes/tags/', None, TagViewSet, 'list'),
+            ('get', f'/api/recipes/tags/{tags[0].pk}/', None,
+             TagViewSet, 'retrieve'),
+            ('get', '/api/recipes/feed/?limit=10', None, FeedViewSet, 'list'),
+            ('get', f'{recipes_url}?limit=20', None, RecipeViewSet, 'list'),
+            ('get', f'{recipes_url}?limit=20&tags={tags[0].slug}'
+                    f'&is_favorited=1', None, RecipeViewSet, 'list'),
+            ('get', f'{recipes_url}?search=рецепт', None,
+             RecipeViewSet, 'list'),
+            ('get', f'{recipes_url}?limit=20&cursor=', None,
+             RecipeViewSet, 'list'),
+            ('get', f'{recipes_url}{recipe}/', None,
+             RecipeViewSet, 'retrieve'),
+            ('post', recipes_url, new_recipe, RecipeViewSet, 'create'),
+            ('patch', f'{recipes_url}{own}/', new_recipe,
+             RecipeViewSet, 'partial_update'),
+            ('post', f'{recipes_url}{recipes[1].pk}/add_to_favorites/',
+             None, RecipeViewSet, 'add_to_favorites'),
+            ('delete', f'{recipes_url}{recipes[1].pk}/remove_from_favorites/',
+             None, RecipeViewSet, 'remove_from_favorites'),
+            ('post', f'{recipes_url}{recipes[2].pk}/add_to_shopping_cart/',
+             None, RecipeViewSet, 'add_to_shopping_cart'),
+            ('delete',
+             f'{recipes_url}{recipes[2].pk}/remove_from_shopping_cart/',
+             None, RecipeViewSet, 'remove_from_shopping_cart'),
+            ('get', f'{recipes_url}download_shopping_cart/?by_recipe=1', None,
+             RecipeViewSet, 'download_shopping_cart'),
+            ('post', f'{recipes_url}import/', lines,
+             RecipeViewSet, 'bulk_import'),
+            ('get', f'{recipes_url}pantry/?ingredients='
+                    f'{ingredients[0].pk},{ingredients[7].pk}', None,
+             RecipeViewSet, 'pantry'),
+            ('get', f'{recipes_url}{recipe}/similar/', None,
+             RecipeViewSet, 'similar'),
+            ('get', f'{recipes_url}{recipe}/get-link/', None,
+             RecipeViewSet, 'get_link'),
+            ('delete', f'{recipes_url}{own}/', None,
+             RecipeViewSet, 'destroy'),
+            ('get', f'{users_url}?limit=10', None, UserViewSet, 'list'),
+            ('get', f'{users_url}{author}/', None, UserViewSet, 'retrieve'),
+            ('post', users_url, {
+                'email': 'new@budget.local', 'username': 'budget_new',
+                'first_name': 'Имя', 'last_name': 'Фамилия',
+                'password': PASSWORD}, UserViewSet, 'create'),
+            ('get', f'{users_url}me/', None, UserViewSet, 'me'),
+            ('get', f'{users_url}subscriptions/?recipes_limit=3', None,
+             UserViewSet, 'subscriptions'),
+            ('post', f'{users_url}{author}/subscribe/', None,
+             UserViewSet, 'subscribe'),
+            ('delete', f'{users_url}{author}/subscribe/', None,
+             UserViewSet, 'subscribe'),
+            ('put', f'{users_url}me/avatar/', {'avatar': PIXEL},
+             UserViewSet, 'avatar'),
+            ('delete', f'{users_url}me/avatar/', None, UserViewSet, 'avatar'),
+            ('post', f'{users_url}set_password/', {
+                'current_password': PASSWORD,
+                'new_password': PASSWORD + '2'},
+             UserViewSet, 'set_password'),
+        ]
+
+    def check_endpoints(self, client, users, ingredients, tags, recipes):
+        for method, url, data, view, action in self.endpoints(
+                users, ingredients, tags, recipes):
+            label = f'{view.__name__}.{action}'
+            budget = get_budget(view, action)
+            if isinstance(data, str):
+                request = {'data': data, 'content_type': 'application/jsonl'}
+            else:
+                request = {'data': data, 'format': 'json'}
+            if budget is None:
+                self.failures.append(label)
+                self.stderr.write(f'{label}: бюджет не задан.')
+                continue
+            try:
+                with query_budget(budget, label) as recorder:
+                    response = getattr(client, method)(url, **request)
+                    # Потоковый ответ читает базу при отдаче тела.
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+            except QueryBudgetExceeded as error:
+                self.failures.append(label)
+                self.stderr.write(str(error))
+                continue
+            if response.status_code >= 400:
+                self.failures.append(label)
+            self.stdout.write(
+                f'{method.upper():<6} {url[:60]:<60} '
+                f'{response.status_code}  SQL {len(recorder)}/{budget}')
@@ -0,0 +1,34 @@
+import json
+
+from api.recipes.importer import RecipeImporter
+from django.core.management.base import BaseCommand, CommandError
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт рецептов из файла JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--author', required=True,
+                            help='email или username автора рецептов.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--report',
+                            help='Куда сохранить отчёт об ошибках (JSON).')
+
+    def handle(self, *args, **options):
+        author = User.objects.filter(email=options['author']).first() or (
+            User.objects.filter(username=options['author']).first())
+        if author is None:
+            raise CommandError('Автор не найден.')
+        with open(options['path'], encoding='utf-8') as file:
+            report = RecipeImporter(author, options['batch_size']).run(file)
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        for error in report['errors'][:20]:
+            self.stdout.write(self.style.WARNING(
+                f'Строка {error["line"]}: {error["errors"]}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано рецептов: {report["created"]}, '
+            f'с ошибками: {report["failed"]}.'))
@@ -0,0 +1,367 @@
+import base64
+import http.client
+import json
+import math
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import count
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+PIXEL = 'data:image/gif;base64,' + base64.b64encode(
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04'
+    b'\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D'
+    b'\x01\x00;').decode()
+# Рецепты, созданные замером; удаляются после прогона.
+RUN_MARK = 'benchmark-run'
+DEFAULT_WEIGHTS = {
+    'feed': 25, 'recipes': 30, 'recipe': 15, 'subscriptions': 10,
+    'shopping_cart': 5, 'create': 5, 'patch': 10,
+}
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Процентиль по ближайшему рангу; values отсортированы."""
+    if not values:
+        return None
+    return values[max(math.ceil(rank / 100 * len(values)) - 1, 0)]
+
+
+def summary(latencies, errors, duration):
+    latencies = sorted(latencies)
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / duration, 2) if duration else None,
+    }
+    for rank in PERCENTILES:
+        value = percentile(latencies, rank)
+        result[f'p{rank}_ms'] = value and round(value * 1000, 2)
+    result['max_ms'] = latencies and round(latencies[-1] * 1000, 2)
+    return result
+
+
+class Workload:
+    """
+    Запросы сценариев по данным seed_benchmark: (токен, метод, адрес,
+    тело). Выбор пользователей и рецептов идёт через rng потока.
+    """
+
+    def __init__(self, prefix, users):
+        sample = list(User.objects.filter(
+            username__startswith=f'{prefix}_').order_by('?')[:users])
+        if not sample:
+            raise CommandError(
+                f'Нет пользователей {prefix}_*: запустите seed_benchmark.')
+        self.tokens = {user.pk: Token.objects.get_or_create(user=user)[0].key
+                       for user in sample}
+        self.user_ids = list(self.tokens)
+        self.recipe_ids = list(Recipe.objects.filter(
+            author__username__startswith=f'{prefix}_').values_list(
+            'id', flat=True))
+        self.own = {}
+        for pk, author_id, name in Recipe.objects.filter(
+                author__in=self.user_ids).values_list(
+                'id', 'author_id', 'name'):
+            self.own.setdefault(author_id, []).append((pk, name))
+        self.tags = list(Tag.objects.filter(
+            slug__startswith=f'{prefix}-').values_list('id', 'slug'))
+        self.ingredients = list(Ingredient.objects.filter(
+            name__startswith=f'{prefix} ').values_list('id', flat=True))
+
+    def user(self, rng):
+        return self.tokens[rng.choice(self.user_ids)]
+
+    def feed(self, rng):
+        return self.user(rng), 'get', '/api/recipes/feed/?limit=10', None
+
+    def recipes(self, rng):
+        params = {'limit': 20}
+        variant = rng.randrange(6)
+        if variant == 0:
+            params['page'] = rng.randint(1, 10)
+        elif variant == 1:
+            params['tags'] = rng.choice(self.tags)[1]
+        elif variant == 2:
+            params['author'] = rng.choice(self.user_ids)
+        elif variant == 3:
+            params['is_favorited'] = 1
+        elif variant == 4:
+            params['is_in_shopping_cart'] = 1
+        else:
+            params['ordering'] = '-favorites_count'
+        return (self.user(rng), 'get',
+                f'/api/recipes/recipes/?{urlencode(params)}', None)
+
+    def recipe(self, rng):
+        return (self.user(rng), 'get',
+                f'/api/recipes/recipes/{rng.choice(self.recipe_ids)}/', None)
+
+    def subscriptions(self, rng):
+        return (self.user(rng), 'get',
+                '/api/users/users/subscriptions/?limit=10&recipes_limit=3',
+                None)
+
+    def shopping_cart(self, rng):
+        return (self.user(rng), 'get',
+                '/api/recipes/recipes/download_shopping_cart/', None)
+
+    def recipe_body(self, rng, name):
+        return {
+            'name': name,
+            'text': 'Рецепт нагрузочного замера.',
+            'cooking_time': rng.randint(5, 180),
+            'tags': [pk for pk, _ in rng.sample(
+                self.tags, min(2, len(self.tags)))],
+            'ingredients': [
+                {'id': pk, 'amount': rng.randint(1, 500)}
+                for pk in rng.sample(self.ingredients, rng.randint(3, 8))],
+        }
+
+    def create(self, rng):
+        body = self.recipe_body(rng, f'{RUN_MARK} {rng.randrange(10 ** 6)}')
+        body['image'] = PIXEL
+        return self.user(rng), 'post', '/api/recipes/recipes/', body
+
+    def patch(self, rng):
+        if not self.own:
+            return self.recipe(rng)
+        author_id = rng.choice(list(self.own))
+        pk, name = rng.choice(self.own[author_id])
+        return (self.tokens[author_id], 'patch',
+                f'/api/recipes/recipes/{pk}/', self.recipe_body(rng, name))
+
+
+class InProcessTransport:
+    """Запросы через полный стек Django в этом процессе."""
+
+    def __init__(self):
+        self.client = Client(SERVER_NAME='localhost',
+                             raise_request_exception=False)
+
+    def send(self, token, method, path, body):
+        response = self.client.generic(
+            method.upper(), path,
+            json.dumps(body) if body is not None else '',
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {token}')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def close(self):
+        connections.close_all()
+
+
+class HTTPTransport:
+    """Запросы к запущенному серверу; соединение на поток."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        if parts.scheme != 'http':
+            raise CommandError('Поддерживается только http://.')
+        self.connection = http.client.HTTPConnection(
+            parts.hostname, parts.port or 80, timeout=30)
+
+    def send(self, token, method, path, body):
+        headers = {'Authorization': f'Token {token}',
+                   'Accept': 'application/json'}
+        if body is not None:
+            body = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        try:
+            return self.request(method.upper(), path, body, headers)
+        except (http.client.HTTPException, ConnectionError):
+            # Сервер закрыл соединение keep-alive: повтор на новом.
+            self.connection.close()
+            return self.request(method.upper(), path, body, headers)
+
+    def request(self, *args):
+        self.connection.request(*args)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status
+
+    def close(self):
+        self.connection.close()
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер по данным seed_benchmark: взвешенные '
+            'сценарии (лента, фильтры, рецепт, подписки, выгрузка корзины, '
+            'создание и изменение рецепта) в несколько потоков через '
+            'WSGI-стек в процессе или по --url к запущенному серверу с той '
+            'же базой. Итог — RPS и p50/p95/p99 по сценариям в JSON, с '
+            '--compare — сравнение с прошлым прогоном. Изменение рецептов '
+            'меняет данные набора; созданные рецепты удаляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Например, http://127.0.0.1:8000.')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--users', type=int, default=50,
+                            help='Сколько пользователей набора участвует.')
+        parser.add_argument('--scenario', action='append', default=[],
+                            metavar='ИМЯ=ВЕС',
+                            help='Вес сценария; 0 отключает его.')
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', help='JSON прошлого прогона.')
+        parser.add_argument('--max-regression', type=float,
+                            help='Допустимый рост p95 и падение RPS, %%.')
+
+    def handle(self, *args, **options):
+        weights = dict(DEFAULT_WEIGHTS)
+        for item in options['scenario']:
+            name, _, weight = item.partition('=')
+            if name not in weights or not weight.isdigit():
+                raise CommandError(f'Неизвестный сценарий или вес: {item}.')
+            weights[name] = int(weight)
+        self.weights = {name: weight for name, weight in weights.items()
+                        if weight}
+        if not self.weights:
+            raise CommandError('Все сценарии отключены.')
+        self.options = options
+        self.workload = Workload(options['prefix'], options['users'])
+        started_at = datetime.now(timezone.utc)
+        try:
+            if options['url']:
+                result = self.run()
+            else:
+                # Картинки созданных рецептов не остаются в MEDIA_ROOT.
+                with tempfile.TemporaryDirectory() as media, \
+                        override_settings(MEDIA_ROOT=media):
+                    result = self.run()
+        finally:
+            Recipe.objects.filter(name__startswith=RUN_MARK).delete()
+        report = {
+            'started_at': started_at.isoformat(),
+            'commit': self.commit(),
+            'mode': 'http' if options['url'] else 'in-process',
+            'url': options['url'],
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'concurrency': options['concurrency'],
+            'weights': self.weights,
+            **result,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.print_report(report)
+        if options['compare']:
+            self.compare(report)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результат записан в {options["output"]}.'))
+
+    def run(self):
+        self.run_phase(self.options['warmup'])
+        started = time.perf_counter()
+        samples = self.run_phase(self.options['requests'])
+        duration = time.perf_counter() - started
+        scenarios = {}
+        for name in self.weights:
+            latencies = [latency for scenario, latency, ok in samples
+                         if scenario == name]
+            errors = sum(1 for scenario, _, ok in samples
+                         if scenario == name and not ok)
+            scenarios[name] = summary(latencies, errors, duration)
+        return {
+            'duration_s': round(duration, 3),
+            'total': summary([latency for _, latency, _ in samples],
+                             sum(1 for *_, ok in samples if not ok),
+                             duration),
+            'scenarios': scenarios,
+        }
+
+    def run_phase(self, total):
+        """total запросов в concurrency потоков: [(сценарий, с, успех)]."""
+        numbers = count()
+        samples = []
+        failures = []
+        names = list(self.weights)
+        weights = list(self.weights.values())
+
+        def worker(index):
+            rng = random.Random(self.options['seed'] * 1000 + index)
+            transport = (HTTPTransport(self.options['url'])
+                         if self.options['url'] else InProcessTransport())
+            try:
+                while next(numbers) < total:
+                    name = rng.choices(names, weights)[0]
+                    request = getattr(self.workload, name)(rng)
+                    start = time.perf_counter()
+                    try:
+                        ok = transport.send(*request) < 400
+                    except OSError:
+                        ok = False
+                    samples.append(
+                        (name, time.perf_counter() - start, ok))
+            except Exception as error:
+                failures.append(error)
+            finally:
+                transport.close()
+
+        threads = [threading.Thread(target=worker, args=(index,))
+                   for index in range(max(self.options['concurrency'], 1))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if failures:
+            raise CommandError(f'Поток замера упал: {failures[0]!r}')
+        return samples
+
+    @staticmethod
+    def commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                text=True, check=True, cwd=settings.BASE_DIR).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def print_report(self, report):
+        rows = [('всего', report['total']), *report['scenarios'].items()]
+        for name, row in rows:
+            self.stdout.write(
+                f'{name:<14} {row["requests"]:>6} запр.  '
+                f'{row["rps"] or 0:>8.1f} rps  p50={row["p50_ms"]} мс  '
+                f'p95={row["p95_ms"]} мс  p99={row["p99_ms"]} мс  '
+                f'ошибок {row["errors"]}')
+
+    def compare(self, report):
+        with open(self.options['compare'], encoding='utf-8') as file:
+            baseline = json.load(file)
+        limit = self.options['max_regression']
+        regressions = []
+        rows = [('всего', report['total'], baseline['total'])] + [
+            (name, row, baseline['scenarios'][name])
+            for name, row in report['scenarios'].items()
+            if name in baseline.get('scenarios', {})]
+        self.stdout.write(f'Сравнение с {baseline.get("commit")}:')
+        for name, row, before in rows:
+            changes = {}
+            for key, worse in (('rps', -1), ('p95_ms', 1)):
+                if row[key] and before[key]:
+                    changes[key] = (row[key] / before[key] - 1) * 100
+                    if limit is not None and changes[key] * worse > limit:
+                        regressions.append(f'{name} {key}')
+            self.stdout.write(f'{name:<14} ' + '  '.join(
+                f'{key} {change:+.1f}%' for key, change in changes.items()))
+        if regressions:
+            raise CommandError('Регрессия сверх порога: '
+                               + ', '.join(regressions))
@@ -0,0 +1,213 @@
+import random
+import time
+from itertools import accumulate
+
+from api.cache import invalidate_reference
+from api.pantry import pantry_changed
+from api.recipes.conditional import recipes_changed
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.feed import fan_out
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTags, ShoppingList, Tag)
+from recipes.search import update_search_index
+from users.models import Subscribe, User
+
+PASSWORD = 'Bench-password-1'
+DISHES = ('Суп', 'Салат', 'Пирог', 'Рагу', 'Каша', 'Запеканка', 'Паста',
+          'Омлет', 'Плов', 'Котлеты', 'Блины', 'Рулет')
+STYLES = ('домашний', 'быстрый', 'праздничный', 'острый', 'летний',
+          'постный', 'сытный', 'по-деревенски')
+UNITS = ('г', 'мл', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса рангов 1..count по закону Ципфа."""
+    return list(accumulate(rank ** -exponent for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Синтетические данные для нагрузочных замеров: пользователи, '
+            'рецепты, теги и ингредиенты вставляются пачками, избранное, '
+            'корзины и подписки распределены по Ципфу (немногие рецепты '
+            'и авторы популярны). Затем пересчитываются счётчики, итоги '
+            'корзин, ленты и поисковый индекс. Все записи помечены '
+            'префиксом, --clear удаляет прежний набор.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=12)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--lines', type=int, default=8,
+                            help='Ингредиентов в рецепте.')
+        parser.add_argument('--favorites', type=int, default=20000)
+        parser.add_argument('--carts', type=int, default=3000)
+        parser.add_argument('--subscriptions', type=int, default=5000)
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Показатель распределения Ципфа.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить данные с тем же префиксом.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно хотя бы 2 пользователя и 1 рецепт.')
+        if options['lines'] > options['ingredients']:
+            raise CommandError('Ингредиентов меньше, чем строк в рецепте.')
+        self.options = options
+        self.prefix = options['prefix']
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+        with transaction.atomic():
+            if options['clear']:
+                self.clear()
+            elif User.objects.filter(
+                    username__startswith=f'{self.prefix}_').exists():
+                raise CommandError(
+                    f'Данные с префиксом {self.prefix} уже есть; '
+                    f'добавьте --clear.')
+            users = self.create_users()
+            tags = self.create_tags()
+            ingredients = self.create_ingredients()
+            # Ранг популярности автора: плодовитые авторы и подписки на
+            # них достаются одним и тем же пользователям.
+            authors = self.rng.sample(users, len(users))
+            recipes = self.create_recipes(authors, tags, ingredients)
+            self.create_pairs(
+                Favorite, 'recipe_id', users,
+                self.rng.sample(recipes, len(recipes)),
+                options['favorites'])
+            self.create_pairs(
+                ShoppingList, 'recipe_id', users,
+                self.rng.sample(recipes, len(recipes)), options['carts'])
+            self.create_pairs(
+                Subscribe, 'author_id', users, authors,
+                options['subscriptions'])
+            self.rebuild(recipes)
+        invalidate_reference(Tag)
+        invalidate_reference(Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(users)}, рецептов {len(recipes)} '
+            f'за {time.perf_counter() - started:.1f} с. Пароль: {PASSWORD}'))
+
+    def clear(self):
+        deleted, _ = User.objects.filter(
+            username__startswith=f'{self.prefix}_').delete()
+        Tag.objects.filter(slug__startswith=f'{self.prefix}-').delete()
+        Ingredient.objects.filter(
+            name__startswith=f'{self.prefix} ').delete()
+        self.stdout.write(f'Удалено строк: {deleted}')
+
+    def create_users(self):
+        # Один хеш на всех: PBKDF2 на каждого занял бы минуты.
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            [User(username=f'{self.prefix}_{i}',
+                  email=f'{self.prefix}{i}@benchmark.local',
+                  first_name='Имя', last_name=f'Фамилия {i}',
+                  password=password)
+             for i in range(self.options['users'])],
+            batch_size=self.batch_size)
+        return list(User.objects.filter(
+            username__startswith=f'{self.prefix}_').order_by('id')
+            .values_list('id', flat=True))
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            [Tag(name=f'{self.prefix} тег {i}', slug=f'{self.prefix}-{i}')
+             for i in range(self.options['tags'])])
+        return list(Tag.objects.filter(
+            slug__startswith=f'{self.prefix}-').values_list('id', flat=True))
+
+    def create_ingredients(self):
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=f'{self.prefix} ингредиент {i}',
+                        measurement_unit=UNITS[i % len(UNITS)])
+             for i in range(self.options['ingredients'])],
+            batch_size=self.batch_size)
+        return list(Ingredient.objects.filter(
+            name__startswith=f'{self.prefix} ').values_list('id', flat=True))
+
+    def create_recipes(self, authors, tags, ingredients):
+        rng = self.rng
+        exponent = self.options['zipf']
+        author_weights = zipf_weights(len(authors), exponent)
+        tag_weights = zipf_weights(len(tags), exponent)
+        ingredient_weights = zipf_weights(len(ingredients), exponent)
+        recipe_tags = []
+        batch = []
+        for i in range(self.options['recipes']):
+            tag_ids = set(rng.choices(
+                tags, cum_weights=tag_weights, k=rng.randint(1, 3)))
+            recipe_tags.append(tag_ids)
+            batch.append(Recipe(
+                author_id=rng.choices(authors, cum_weights=author_weights)[0],
+                name=f'{rng.choice(DISHES)} {rng.choice(STYLES)} {i}',
+                text=' '.join(rng.choices(DISHES + STYLES, k=30)),
+                cooking_time=rng.randint(5, 180),
+                image=f'recipes/{self.prefix}.png',
+                tag_mask=Recipe.make_tag_mask(tag_ids)))
+        Recipe.objects.bulk_create(batch, batch_size=self.batch_size)
+        # id без RETURNING (SQLite) узнаём по порядку вставки.
+        recipes = list(Recipe.objects.filter(
+            author__username__startswith=f'{self.prefix}_').order_by('id')
+            .values_list('id', flat=True))
+        RecipeTags.objects.bulk_create(
+            [RecipeTags(recipe_id=recipe_id, tag_id=tag_id)
+             for recipe_id, tag_ids in zip(recipes, recipe_tags)
+             for tag_id in tag_ids],
+            batch_size=self.batch_size)
+        lines = []
+        for recipe_id in recipes:
+            chosen = set()
+            while len(chosen) < self.options['lines']:
+                chosen.update(rng.choices(
+                    ingredients, cum_weights=ingredient_weights,
+                    k=self.options['lines'] - len(chosen)))
+            lines += [RecipeIngredient(recipe_id=recipe_id, ingredient_id=pk,
+                                       amount=rng.randint(1, 500))
+                      for pk in chosen]
+            if len(lines) >= self.batch_size:
+                RecipeIngredient.objects.bulk_create(lines)
+                lines = []
+        RecipeIngredient.objects.bulk_create(lines)
+        return recipes
+
+    def create_pairs(self, model, target_field, users, targets, count):
+        """
+        count уникальных пар (пользователь, цель): пользователи равномерно,
+        цели по Ципфу в порядке targets. Подписки на себя пропускаются.
+        """
+        weights = zipf_weights(len(targets), self.options['zipf'])
+        pairs = set()
+        attempts = 0
+        while len(pairs) < count and attempts < count * 10:
+            needed = count - len(pairs)
+            attempts += needed
+            pairs.update(
+                (user_id, target) for user_id, target in zip(
+                    self.rng.choices(users, k=needed),
+                    self.rng.choices(targets, cum_weights=weights, k=needed))
+                if model is not Subscribe or user_id != target)
+        model.objects.bulk_create(
+            [model(user_id=user_id, **{target_field: target})
+             for user_id, target in pairs],
+            batch_size=self.batch_size, ignore_conflicts=True)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {len(pairs)}')
+
+    def rebuild(self, recipe_ids):
+        """Денормализованные данные, которые bulk_create не обновил."""
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('shopping_totals', stdout=self.stdout)
+        update_search_index(recipe_ids)
+        fan_out(Recipe.objects.filter(
+            author__username__startswith=f'{self.prefix}_').only(
+            'id', 'author_id', 'pub_date').iterator())
+        pantry_changed(*recipe_ids)
+        recipes_changed()
@@ -0,0 +1,346 @@
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+METRICS = {
+    'foodgram_http_requests_total': (
+        COUNTER, 'Обработанные запросы по маршруту, методу и статусу.'),
+    'foodgram_http_request_duration_seconds': (
+        HISTOGRAM, 'Время ответа по маршруту и методу.'),
+    'foodgram_db_queries_per_request': (
+        HISTOGRAM, 'Число SQL-запросов на запрос по маршруту.'),
+    'foodgram_http_requests_in_progress': (
+        GAUGE, 'Запросы в обработке по маршруту.'),
+}
+BUCKETS = {
+    'foodgram_http_request_duration_seconds': LATENCY_BUCKETS,
+    'foodgram_db_queries_per_request': QUERY_BUCKETS,
+}
+
+HEADER = struct.Struct('Q')
+VALUE = struct.Struct('d')
+INITIAL_SIZE = 64 * 1024
+FILE_PREFIX = 'metrics_'
+ARCHIVE_NAME = 'archive.db'
+LOCK_NAME = 'metrics.lock'
+
+
+class ValueFile:
+    """
+    Значения метрик одного процесса в отображённом в память файле.
+
+    Файл — заголовок с числом занятых байт и записи «длина ключа, ключ,
+    выравнивание до 8 байт, double». Процесс пишет только в свой файл,
+    поэтому блокировки между воркерами не нужны; читатель берёт записи
+    до отметки из заголовка, которая сдвигается после записи ключа.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.positions = {}
+        self.file = open(path, 'w+b')
+        self.file.truncate(INITIAL_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), INITIAL_SIZE)
+        self.used = HEADER.size
+        HEADER.pack_into(self.map, 0, self.used)
+
+    def append(self, key):
+        encoded = key.encode()
+        size = 4 + len(encoded)
+        size += -size % VALUE.size
+        if self.used + size + VALUE.size > len(self.map):
+            length = len(self.map) * 2
+            self.map.close()
+            self.file.truncate(length)
+            self.map = mmap.mmap(self.file.fileno(), length)
+        struct.pack_into(f'I{len(encoded)}s', self.map, self.used,
+                         len(encoded), encoded)
+        position = self.used + size
+        VALUE.pack_into(self.map, position, 0.0)
+        self.used = position + VALUE.size
+        HEADER.pack_into(self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def add(self, key, amount):
+        with self.lock:
+            position = self.positions.get(key)
+            if position is None:
+                position = self.append(key)
+            value = VALUE.unpack_from(self.map, position)[0]
+            VALUE.pack_into(self.map, position, value + amount)
+
+    @staticmethod
+    def read(path):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < HEADER.size:
+            return
+        used = min(HEADER.unpack_from(data, 0)[0], len(data))
+        position = HEADER.size
+        while position < used:
+            length = struct.unpack_from('I', data, position)[0]
+            key = data[position + 4:position + 4 + length].decode()
+            size = 4 + length
+            position += size + -size % VALUE.size
+            yield key, VALUE.unpack_from(data, position)[0]
+            position += VALUE.size
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+@contextmanager
+def metrics_lock(shared=False):
+    """Блокировка каталога метрик: слияние файлов против чтения."""
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    with open(os.path.join(settings.METRICS_DIR, LOCK_NAME), 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+
+
+def store_path(pid):
+    return os.path.join(settings.METRICS_DIR, f'{FILE_PREFIX}{pid}.db')
+
+
+def file_pid(name):
+    return int(name[len(FILE_PREFIX):].split('.')[0])
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_gauge(key):
+    return METRICS.get(json.loads(key)[0], (None,))[0] == GAUGE
+
+
+def merge_into_archive(paths):
+    """
+    Счётчики и гистограммы из файлов завершённых процессов переносятся
+    в общий архив, файлы удаляются (как mark_process_dead в
+    prometheus_client); датчики мёртвых процессов отбрасываются.
+    """
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        return
+    archive = os.path.join(settings.METRICS_DIR, ARCHIVE_NAME)
+    values = {}
+    for path in ([archive] if os.path.exists(archive) else []) + paths:
+        for key, value in ValueFile.read(path):
+            if not is_gauge(key):
+                values[key] = values.get(key, 0.0) + value
+    merged = ValueFile(f'{archive}.tmp')
+    for key, value in values.items():
+        merged.add(key, value)
+    merged.close()
+    os.replace(f'{archive}.tmp', archive)
+    for path in paths:
+        os.remove(path)
+
+
+def mark_process_dead(pid):
+    """Для хука завершения воркера (например, child_exit gunicorn)."""
+    with metrics_lock():
+        merge_into_archive([store_path(pid)])
+
+
+def merge_dead_processes():
+    """
+    Файлы процессов, которых уже нет, и файл с pid текущего процесса:
+    pid мог достаться ему от завершённого воркера, и открытие файла
+    заново обнулило бы его счётчики.
+    """
+    with metrics_lock():
+        merge_into_archive([
+            os.path.join(settings.METRICS_DIR, name)
+            for name in os.listdir(settings.METRICS_DIR)
+            if name.startswith(FILE_PREFIX)
+            and (file_pid(name) == os.getpid()
+                 or not is_alive(file_pid(name)))])
+
+
+def get_store():
+    """
+    Файл значений текущего процесса (свой у каждого воркера). При
+    создании файлы завершённых процессов сливаются в архив.
+    """
+    global _store
+    if _store is None or _store.pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store.pid != os.getpid():
+                merge_dead_processes()
+                _store = ValueFile(store_path(os.getpid()))
+    return _store
+
+
+def metric_key(name, **labels):
+    return json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+
+
+def inc(name, amount=1, **labels):
+    get_store().add(metric_key(name, **labels), amount)
+
+
+def observe(name, value, **labels):
+    """Наблюдение гистограммы: свой бакет, сумма и счётчик."""
+    buckets = BUCKETS[name]
+    bound = next((bound for bound in buckets if value <= bound), '+Inf')
+    store = get_store()
+    store.add(metric_key(name, le=str(bound), **labels), 1)
+    store.add(metric_key(f'{name}_sum', **labels), value)
+    store.add(metric_key(f'{name}_count', **labels), 1)
+
+
+def collect():
+    """
+    Значения всех процессов и архива: счётчики и гистограммы суммируются
+    и для завершённых воркеров (иначе счётчики пойдут назад), датчики —
+    только для живых.
+    """
+    values = {}
+    directory = settings.METRICS_DIR
+    if not os.path.isdir(directory):
+        return values
+    with metrics_lock(shared=True):
+        for name in os.listdir(directory):
+            if name == ARCHIVE_NAME:
+                alive = False
+            elif name.startswith(FILE_PREFIX):
+                alive = is_alive(file_pid(name))
+            else:
+                continue
+            for key, value in ValueFile.read(os.path.join(directory, name)):
+                if is_gauge(key) and not alive:
+                    continue
+                metric, labels = json.loads(key)
+                key = (metric, tuple(map(tuple, labels)))
+                values[key] = values.get(key, 0.0) + value
+    return values
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n')) for name, value in labels)
+    return '{' + ','.join(f'{name}="{value}"'
+                          for name, value in escaped) + '}'
+
+
+def format_value(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def exposition():
+    """Все метрики в текстовом формате Prometheus."""
+    values = collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        if kind != HISTOGRAM:
+            lines += [f'{name}{format_labels(labels)} {format_value(value)}'
+                      for (metric, labels), value in sorted(values.items())
+                      if metric == name]
+            continue
+        series = sorted({labels for metric, labels in values
+                         if metric == f'{name}_count'})
+        for labels in series:
+            total = 0
+            for bound in (*BUCKETS[name], '+Inf'):
+                total += values.get(
+                    (name, tuple(sorted((*labels, ('le', str(bound)))))), 0)
+                bucket_labels = (*labels, ('le', str(bound)))
+                lines.append(f'{name}_bucket{format_labels(bucket_labels)} '
+                             f'{format_value(total)}')
+            for suffix in ('sum', 'count'):
+                lines.append(
+                    f'{name}_{suffix}{format_labels(labels)} '
+                    f'{format_value(values[(f"{name}_{suffix}", labels)])}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Внутренний адрес для сборщика метрик; nginx его не проксирует."""
+    return HttpResponse(exposition(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.view_name
+
+
+class MetricsMiddleware:
+    """
+    Задержка, статусы, число SQL на запрос и запросы в обработке по
+    имени маршрута DRF (recipes-list, users-subscriptions и т. п.).
+    Время потоковых ответов считается до начала отдачи тела.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(count))
+                response = self.get_response(request)
+        finally:
+            route = route_name(request)
+            if getattr(request, 'metrics_in_progress', False):
+                inc('foodgram_http_requests_in_progress', -1, route=route)
+        duration = time.perf_counter() - start
+        inc('foodgram_http_requests_total', route=route,
+            method=request.method, status=str(response.status_code))
+        observe('foodgram_http_request_duration_seconds', duration,
+                route=route, method=request.method)
+        observe('foodgram_db_queries_per_request', queries[0], route=route)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_in_progress = True
+        inc('foodgram_http_requests_in_progress', route=route_name(request))
+        return None
@@ -1,5 +1,138 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q, Window
+from rest_framework import exceptions
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class RecipePaginator(PageNumberPagination):
+    """
+    Постраничный вывод по номеру страницы или, если в запросе есть
+    параметр cursor (для первой страницы — пустой), по ключу: без
+    COUNT(*) и OFFSET, за один индексный проход. Курсор листает только
+    в порядке cursor_ordering: явная сортировка запроса (ordering)
+    с ним — ошибка 400, а не молча подменённый порядок.
+    """
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Готовые последовательности (не QuerySet) листаются по номеру.
+        if (self.cursor_query_param not in request.query_params
+                or not hasattr(queryset, 'order_by')):
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+        ordering = getattr(view, 'cursor_ordering', self.cursor_ordering)
+        explicit = tuple(queryset.query.order_by)
+        if explicit and explicit != tuple(ordering[:len(explicit)]):
+            raise exceptions.ValidationError({self.cursor_query_param: (
+                f'Курсор листает в порядке {", ".join(ordering)}; '
+                f'для другой сортировки используйте номер страницы.')})
+
+        def fetch(position, limit):
+            rows = queryset.order_by(*ordering)
+            if position:
+                rows = rows.filter(self.after(position))
+            return list(rows[:limit])
+
+        return self.paginate_by_key(request, queryset.model, fetch, ordering)
+
+    def paginate_by_key(self, request, model, fetch, ordering=None):
+        """
+        Страница по ключу: fetch(позиция, limit) возвращает объекты
+        строго после позиции (или с начала, если её нет) в порядке ordering.
+        """
+        self.keyset = True
+        self.request = request
+        self.ordering = ordering or self.cursor_ordering
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        cursor = request.query_params.get(self.cursor_query_param)
+        position = self.decode_cursor(model, cursor) if cursor else None
+        page_size = self.get_page_size(request)
+        page = fetch(position, page_size + 1)
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            last = page[-1]
+            # Страница может состоять из строк values().
+            self.next_position = [
+                last[field] if isinstance(last, dict)
+                else getattr(last, field) for field in self.fields]
+        return page
+
+    def validator_page(self, queryset, request, view=None):
+        """
+        Строки страницы values() для условных запросов одним запросом:
+        вместе с общим числом строк (оконный COUNT) или, при листании по
+        ключу, с позицией следующей страницы. None — страницы нет.
+        """
+        if self.cursor_query_param in request.query_params:
+            rows = self.paginate_queryset(queryset, request, view)
+            return rows, self.next_position
+        page_size = self.get_page_size(request)
+        try:
+            number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            return None
+        if number < 1:
+            return None
+        offset = (number - 1) * page_size
+        rows = list(queryset.annotate(total=Window(Count('pk')))[
+            offset:offset + page_size])
+        if not rows:
+            return None
+        return rows, rows[0]['total']
+
+    def after(self, position):
+        """Условие «строго после позиции» для составного ключа."""
+        condition = Q()
+        equal = Q()
+        for name, field, value in zip(self.ordering, self.fields, position):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        # Нестрогая граница по первому полю даёт диапазонный проход
+        # по индексу: OR из условия выше индекс сам не использует.
+        lookup = 'lte' if self.ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{self.fields[0]}__{lookup}': position[0]}) & condition
+
+    def encode_cursor(self, position):
+        data = json.dumps(
+            [value.isoformat() if hasattr(value, 'isoformat') else value
+             for value in position])
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, model, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [model._meta.get_field(field).to_python(value)
+                    for field, value in zip(self.fields, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise exceptions.NotFound('Неверный курсор.')
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            remove_query_param(self.request.build_absolute_uri(),
+                               self.page_query_param),
+            self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data)
+        ]))
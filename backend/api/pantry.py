@@ -0,0 +1,338 @@
+import copy
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from recipes.models import Recipe, RecipeChange, RecipeIngredient
+
+# Старые записи журнала удаляются при каждой PRUNE_EVERY-й записи.
+PRUNE_EVERY = 100
+
+BYTE_BITS = [bin(byte).count('1') for byte in range(256)]
+
+
+def bit_count(mask):
+    return bin(mask).count('1')
+
+
+def high_bits(mask, skip, count):
+    """Номера единичных битов маски от старших к младшим: срез [skip:]."""
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    found = []
+    for position in range(len(data) - 1, -1, -1):
+        byte = data[position]
+        if skip >= BYTE_BITS[byte]:
+            skip -= BYTE_BITS[byte]
+            continue
+        for bit in range(7, -1, -1):
+            if byte >> bit & 1:
+                if skip:
+                    skip -= 1
+                    continue
+                found.append(position * 8 + bit)
+                if len(found) == count:
+                    return found
+    return found
+
+
+class PantryRanking:
+    """
+    Рецепты по числу недостающих ингредиентов, при равенстве — от новых
+    к старым. Хранится как битовые маски рецептов по числу недостающих;
+    id извлекаются только для запрошенного среза, поэтому ранжирование
+    отдаётся пагинатору как обычная последовательность.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = [(missing, mask, bit_count(mask))
+                        for missing, mask in buckets if mask]
+
+    def __len__(self):
+        return sum(size for _, _, size in self.buckets)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        found = []
+        offset = 0
+        for missing, mask, size in self.buckets:
+            if offset >= stop:
+                break
+            if offset + size > start:
+                skip = max(start - offset, 0)
+                found += [(pk, missing) for pk in high_bits(
+                    mask, skip, min(stop - offset, size) - skip)]
+            offset += size
+        return found
+
+
+class PantryIndex:
+    """
+    Обратный индекс «ингредиент → рецепты» для поиска по продуктам.
+
+    Рецепты популярного ингредиента хранятся битовой маской по id
+    рецепта, редкого — отсортированным массивом id: каждый раз выбирается
+    более компактный вид. Совпадения по продуктам складываются
+    поразрядно (по маске на каждый двоичный разряд счётчика), так что
+    число недостающих ингредиентов считается сразу для всех рецептов
+    операциями над целыми, а не циклом по рецептам.
+    """
+
+    def __init__(self, rows):
+        postings = {}
+        self.sizes = array('H')
+        for recipe_id, items in groupby(rows, key=lambda row: row[0]):
+            ingredient_ids = [ingredient_id for _, ingredient_id in items]
+            self.set_size(recipe_id, len(ingredient_ids))
+            for ingredient_id in ingredient_ids:
+                postings.setdefault(ingredient_id, array('Q')).append(
+                    recipe_id)
+        self.postings = {}
+        self.masks = {}
+        for ingredient_id, posting in postings.items():
+            if len(posting) * 32 > len(self.sizes):
+                self.masks[ingredient_id] = self.to_mask(posting)
+            else:
+                self.postings[ingredient_id] = posting
+        self.size_slices = self.slices(self.sizes)
+        self.sequence = 0
+
+    @staticmethod
+    def to_mask(recipe_ids):
+        data = bytearray((max(recipe_ids, default=0) >> 3) + 1)
+        for recipe_id in recipe_ids:
+            data[recipe_id >> 3] |= 1 << (recipe_id & 7)
+        return int.from_bytes(data, 'little')
+
+    @staticmethod
+    def slices(values):
+        """Маски двоичных разрядов: i-я маска — рецепты с i-м битом."""
+        bits = [bytearray((len(values) >> 3) + 1)
+                for _ in range(max(values, default=0).bit_length())]
+        for recipe_id, value in enumerate(values):
+            for bit, data in enumerate(bits):
+                if value >> bit & 1:
+                    data[recipe_id >> 3] |= 1 << (recipe_id & 7)
+        return [int.from_bytes(data, 'little') for data in bits]
+
+    def copy(self):
+        """
+        Копия для изменения: update() меняет индекс на месте, а поиск
+        в других потоках читает его без блокировки.
+        """
+        index = copy.copy(self)
+        index.sizes = array('H', self.sizes)
+        index.size_slices = list(self.size_slices)
+        index.masks = dict(self.masks)
+        index.postings = {pk: array('Q', posting)
+                          for pk, posting in self.postings.items()}
+        return index
+
+    def set_size(self, recipe_id, size):
+        if recipe_id >= len(self.sizes):
+            self.sizes.extend([0] * (recipe_id + 1 - len(self.sizes)))
+        self.sizes[recipe_id] = size
+
+    def update_size_slices(self, recipe_id):
+        size = self.sizes[recipe_id]
+        while size.bit_length() > len(self.size_slices):
+            self.size_slices.append(0)
+        bit = 1 << recipe_id
+        for position, slice_mask in enumerate(self.size_slices):
+            if size >> position & 1:
+                self.size_slices[position] = slice_mask | bit
+            elif slice_mask & bit:
+                self.size_slices[position] = slice_mask ^ bit
+
+    def remove(self, recipe_id):
+        if recipe_id >= len(self.sizes) or not self.sizes[recipe_id]:
+            return
+        bit = 1 << recipe_id
+        for ingredient_id, mask in self.masks.items():
+            if mask & bit:
+                self.masks[ingredient_id] = mask ^ bit
+        for posting in self.postings.values():
+            position = bisect_left(posting, recipe_id)
+            if position < len(posting) and posting[position] == recipe_id:
+                del posting[position]
+        self.set_size(recipe_id, 0)
+
+    def add(self, recipe_id, ingredient_ids):
+        bit = 1 << recipe_id
+        for ingredient_id in ingredient_ids:
+            if ingredient_id in self.masks:
+                self.masks[ingredient_id] |= bit
+                continue
+            posting = self.postings.setdefault(ingredient_id, array('Q'))
+            if not posting or posting[-1] < recipe_id:
+                posting.append(recipe_id)
+            else:
+                insort(posting, recipe_id)
+        self.set_size(recipe_id, len(ingredient_ids))
+
+    def update(self, recipes):
+        """Заменяет ингредиенты рецептов: {id рецепта: [id ингредиентов]}."""
+        for recipe_id, ingredient_ids in recipes.items():
+            self.remove(recipe_id)
+            if ingredient_ids:
+                self.add(recipe_id, ingredient_ids)
+            if recipe_id < len(self.sizes):
+                self.update_size_slices(recipe_id)
+
+    def search(self, ingredient_ids):
+        """Рецепты хотя бы с одним из продуктов, по числу недостающих."""
+        hits = []
+        for pk in set(ingredient_ids):
+            mask = self.masks.get(pk)
+            if mask is None:
+                mask = self.to_mask(self.postings.get(pk, ()))
+            for bit, slice_mask in enumerate(hits):
+                hits[bit], mask = slice_mask ^ mask, slice_mask & mask
+                if not mask:
+                    break
+            if mask:
+                hits.append(mask)
+        found = 0
+        for slice_mask in hits:
+            found |= slice_mask
+        if not found:
+            return PantryRanking([])
+        # Недостающие = размер рецепта - совпадения, вычитание столбиком.
+        full = (1 << max(len(self.sizes), found.bit_length())) - 1
+        missing = []
+        borrow = 0
+        for bit, size in enumerate(self.size_slices):
+            hit = hits[bit] if bit < len(hits) else 0
+            missing.append(size ^ hit ^ borrow)
+            borrow = ((full ^ size) & (hit | borrow)) | (hit & borrow & size)
+        buckets = []
+        for count in range(1 << len(missing)):
+            mask = found
+            for bit, slice_mask in enumerate(missing):
+                mask &= slice_mask if count >> bit & 1 else full ^ slice_mask
+                if not mask:
+                    break
+            buckets.append((count, mask))
+        return PantryRanking(buckets)
+
+
+def recipe_ingredients(recipe_ids=None):
+    rows = RecipeIngredient.objects.order_by('recipe_id')
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    return rows.values_list('recipe_id', 'ingredient_id').iterator()
+
+
+_pending = threading.local()
+
+
+def pantry_changed(*recipe_ids):
+    """
+    Записывает изменение рецептов в журнал (таблица RecipeChange) после
+    фиксации транзакции: журнал общий для всех процессов. Изменения
+    одной транзакции (построчные сигналы RecipeIngredient) собираются
+    в одну запись; id из откатившейся транзакции попадут в следующую,
+    лишнее перечитывание рецепта безвредно.
+    """
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+    _pending.ids.update(recipe_ids)
+
+    def record():
+        if not _pending.ids:
+            # Записано первым обработчиком этой транзакции.
+            return
+        ids, _pending.ids = sorted(_pending.ids), set()
+        change = RecipeChange.objects.create(recipe_ids=ids)
+        if change.pk % PRUNE_EVERY == 0:
+            RecipeChange.objects.filter(
+                created_at__lt=timezone.now() - timezone.timedelta(
+                    seconds=settings.PANTRY_JOURNAL_TIMEOUT)).delete()
+
+    transaction.on_commit(record)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver(post_delete, sender=Recipe)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    pantry_changed(
+        instance.pk if sender is Recipe else instance.recipe_id)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def build_pantry_index():
+    # Сначала позиция журнала, затем данные: изменения, записанные
+    # между запросами, будут применены повторно, а не потеряны.
+    sequence = RecipeChange.objects.order_by('-id').values_list(
+        'id', flat=True).first() or 0
+    index = PantryIndex(recipe_ingredients())
+    index.sequence = sequence
+    return index
+
+
+def catch_up(index):
+    """
+    Индекс с применёнными записями журнала новее index.sequence:
+    изменения вносятся в копию, исходный индекс не меняется. Позиция не
+    сдвигается дальше записей моложе PANTRY_JOURNAL_SETTLE секунд:
+    id выдаются до фиксации, и запись с меньшим id может появиться
+    позже. Повторное применение безопасно — состав рецепта заменяется.
+    """
+    changes = list(RecipeChange.objects.filter(
+        id__gt=index.sequence).order_by('id').values_list(
+        'id', 'recipe_ids', 'created_at'))
+    settled = timezone.now() - timezone.timedelta(
+        seconds=settings.PANTRY_JOURNAL_SETTLE)
+    changed = set()
+    sequence = index.sequence
+    fresh = False
+    for pk, recipe_ids, created_at in changes:
+        changed.update(recipe_ids)
+        fresh = fresh or created_at > settled
+        if not fresh:
+            sequence = pk
+    if changed:
+        recipes = {pk: [] for pk in changed}
+        for recipe_id, ingredient_id in recipe_ingredients(changed):
+            recipes[recipe_id].append(ingredient_id)
+        index = index.copy()
+        index.update(recipes)
+    index.sequence = sequence
+    return index
+
+
+def get_pantry_index():
+    """
+    Индекс процесса, догнанный по журналу изменений в базе.
+
+    Журнал опрашивается не чаще раза в PANTRY_POLL_INTERVAL секунд,
+    рецепты из новых записей перечитываются одним запросом. Если индекс
+    не синхронизировался дольше срока хранения журнала, он строится
+    заново.
+    """
+    global _index
+    now = time.monotonic()
+    if (_index is not None
+            and now - _index.polled_at < settings.PANTRY_POLL_INTERVAL):
+        return _index
+    with _index_lock:
+        if (_index is None
+                or now - _index.polled_at > settings.PANTRY_JOURNAL_TIMEOUT):
+            _index = build_pantry_index()
+        elif now - _index.polled_at >= settings.PANTRY_POLL_INTERVAL:
+            # Готовый индекс подменяется одним присваиванием: поиск видит
+            # либо прежний, либо полностью обновлённый.
+            _index = catch_up(_index)
+        _index.polled_at = now
+    return _index
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import time
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTags, ShoppingList, Tag)
+from recipes.signals import AUTHOR_FIELDS
+from users.models import Subscribe, User
+
+from ..cache import get_reference_cache
+
+LIST_STAMP_KEY = 'recipes:list:stamp'
+VALIDATOR_FIELDS = ('id', 'pub_date', 'updated_at', 'is_favorited',
+                    'is_in_shopping_cart', 'author_is_subscribed')
+
+
+def user_stamp_key(user_id):
+    return f'recipes:user:{user_id}:stamp'
+
+
+def get_stamp(key):
+    """Время последнего изменения; неизвестное считается текущим."""
+    cache = get_reference_cache()
+    stamp = cache.get(key)
+    if stamp is None:
+        stamp = int(time.time())
+        if not cache.add(key, stamp, timeout=None):
+            stamp = cache.get(key, stamp)
+    return stamp
+
+
+def recipes_changed(*keys):
+    """
+    Сдвигает время изменения списков рецептов (и отметок пользователей
+    из keys) после фиксации транзакции. Нужно для Last-Modified:
+    удалённый или выбывший из фильтра рецепт по updated_at не виден.
+    """
+
+    def record():
+        now = int(time.time())
+        get_reference_cache().set_many(
+            {key: now for key in (LIST_STAMP_KEY, *keys)}, timeout=None)
+
+    transaction.on_commit(record)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingList)
+@receiver((post_save, post_delete), sender=Subscribe)
+def user_flags_changed(sender, instance, **kwargs):
+    # Избранное и корзины меняют ещё и сортировку по счётчикам.
+    recipes_changed(user_stamp_key(instance.user_id))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=RecipeTags)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def recipe_data_changed(sender, **kwargs):
+    recipes_changed()
+
+
+@receiver(post_save, sender=User)
+def author_data_changed(sender, created, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login: списки не меняются.
+    if created or (update_fields is not None
+                   and not set(update_fields) & AUTHOR_FIELDS):
+        return
+    recipes_changed()
+
+
+def make_etag(request, *parts):
+    content = json.dumps(
+        [request.user.pk, request.accepted_renderer.format, *parts],
+        default=str)
+    return quote_etag(hashlib.md5(content.encode()).hexdigest())
+
+
+def validator_values(rows):
+    """Поля VALIDATOR_FIELDS из строк values() или объектов Recipe."""
+    return [{field: row[field] if isinstance(row, dict)
+             else getattr(row, field) for field in VALIDATOR_FIELDS}
+            for row in rows]
+
+
+def is_conditional(request):
+    return ('HTTP_IF_NONE_MATCH' in request.META
+            or 'HTTP_IF_MODIFIED_SINCE' in request.META)
+
+
+class ConditionalRecipeMixin:
+    """
+    Условные GET-запросы к рецептам (If-None-Match / If-Modified-Since).
+
+    ETag считается по строкам рецептов ответа: id, время изменения и
+    отметки пользователя, а для страницы списка — ещё и общее число
+    рецептов или позиция следующей страницы. Для условного запроса он
+    считается заранее одним запросом, и при совпадении отдаётся 304 без
+    сериализации; для обычного списка — по уже выбранной странице и
+    числу строк из пагинатора, без лишних запросов. Last-Modified
+    учитывает ещё и время изменения списков и отметок пользователя из
+    кэша (с LocMemCache — в пределах воркера), ETag при этом
+    проверяется первым.
+    """
+    page_rows = None
+
+    def paginate_queryset(self, queryset):
+        self.page_rows = super().paginate_queryset(queryset)
+        return self.page_rows
+
+    def validator_rows(self, queryset):
+        return queryset.with_user_flags(self.request.user).values(
+            *VALIDATOR_FIELDS)
+
+    def last_modified(self, request, rows, *keys):
+        if request.user.is_authenticated:
+            keys += (user_stamp_key(request.user.pk),)
+        return max([int(row['updated_at'].timestamp()) for row in rows]
+                   + [get_stamp(key) for key in keys])
+
+    def retrieve_validator(self, request):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            rows = list(self.validator_rows(Recipe.objects.filter(pk=lookup)))
+        except (TypeError, ValueError):
+            return None
+        if not rows:
+            return None
+        rows = validator_values(rows)
+        return make_etag(request, rows), self.last_modified(request, rows)
+
+    def list_validator(self, request):
+        if self.paginator is None:
+            return None
+        page = self.paginator.validator_page(
+            self.validator_rows(self.filter_queryset(Recipe.objects.all())),
+            request, self)
+        if page is None:
+            return None
+        rows, bound = page
+        return self.page_validator(request, rows, bound)
+
+    def page_validator(self, request, rows, bound):
+        rows = validator_values(rows)
+        return (make_etag(request, bound, rows),
+                self.last_modified(request, rows, LIST_STAMP_KEY))
+
+    def response_page_validator(self, request):
+        """Валидатор по странице, которую уже выбрал ответ."""
+        if not self.page_rows:
+            return None
+        if self.paginator.keyset:
+            bound = self.paginator.next_position
+        else:
+            bound = self.paginator.page.paginator.count
+        return self.page_validator(request, self.page_rows, bound)
+
+    def conditional_list(self, handler, request, *args, **kwargs):
+        if is_conditional(request):
+            return self.conditional_response(
+                self.list_validator(request), handler,
+                request, *args, **kwargs)
+        response = handler(request, *args, **kwargs)
+        validator = self.response_page_validator(request)
+        if validator is not None:
+            self.add_validator(response, *validator)
+        return response
+
+    def conditional_response(self, validator, handler, request,
+                             *args, **kwargs):
+        if validator is None:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = validator
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        self.add_validator(response, etag, last_modified)
+        return response
+
+    def add_validator(self, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            # Отметки пользователя входят в ответ.
+            patch_vary_headers(response, ('Authorization', ))
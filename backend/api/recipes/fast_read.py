@@ -0,0 +1,117 @@
+from collections import defaultdict
+from operator import itemgetter
+
+from recipes.models import Recipe, RecipeIngredient, Tag
+from users.models import User
+
+from ..users.serializers import UserReadSerializer
+from .serializers import RecipeIngredientSerializer, RecipeReadSerializer
+
+RECIPE_IMAGE = Recipe._meta.get_field('image')
+USER_AVATAR = User._meta.get_field('avatar')
+
+
+def file_url(field, request=None):
+    """URL файла по имени, как у FileField в DRF."""
+    storage = field.storage
+
+    def get(name):
+        if not name:
+            return None
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+
+    return get
+
+
+def avatar_url(name):
+    """URL аватара, как у UserReadSerializer.get_avatar."""
+    return USER_AVATAR.storage.url(name) if name else ''
+
+
+def compile_fields(fields, extractors):
+    """
+    Извлекатели полей в порядке полей сериализатора: поле, которого
+    здесь нет, сразу даёт KeyError, а не расхождение ответов.
+    """
+    return tuple((name, extractors[name]) for name in fields)
+
+
+def build(fields, row):
+    return {name: get(row) for name, get in fields}
+
+
+AUTHOR_FIELDS = compile_fields(UserReadSerializer.Meta.fields, {
+    'email': itemgetter('author__email'),
+    'id': itemgetter('author_id'),
+    'username': itemgetter('author__username'),
+    'first_name': itemgetter('author__first_name'),
+    'last_name': itemgetter('author__last_name'),
+    'is_subscribed': itemgetter('author_is_subscribed'),
+    'avatar': lambda row: avatar_url(row['author__avatar']),
+})
+TAG_FIELDS = compile_fields(
+    [field.name for field in Tag._meta.concrete_fields],
+    {'id': itemgetter('id'), 'name': itemgetter('name'),
+     'slug': itemgetter('slug')})
+INGREDIENT_FIELDS = compile_fields(RecipeIngredientSerializer.Meta.fields, {
+    'id': itemgetter('ingredient_id'),
+    'name': itemgetter('ingredient__name'),
+    'measurement_unit': itemgetter('ingredient__measurement_unit'),
+    'amount': itemgetter('amount'),
+})
+RECIPE_VALUES = (
+    'id', 'name', 'image', 'text', 'cooking_time', 'author_id',
+    'author__email', 'author__username', 'author__first_name',
+    'author__last_name', 'author__avatar',
+    'is_favorited', 'is_in_shopping_cart', 'author_is_subscribed',
+)
+
+
+def recipe_fields(request):
+    image = file_url(RECIPE_IMAGE, request)
+    return compile_fields(RecipeReadSerializer.Meta.fields, {
+        'id': itemgetter('id'),
+        'tags': itemgetter('tags'),
+        'author': lambda row: build(AUTHOR_FIELDS, row),
+        'ingredients': itemgetter('ingredients'),
+        'is_favorited': itemgetter('is_favorited'),
+        'is_in_shopping_cart': itemgetter('is_in_shopping_cart'),
+        'name': itemgetter('name'),
+        'image': lambda row: image(row['image']),
+        'text': itemgetter('text'),
+        'cooking_time': itemgetter('cooking_time'),
+    })
+
+
+def recipe_values(queryset, user):
+    """Строки рецептов с автором и отметками пользователя одним запросом."""
+    # pub_date и updated_at — для курсора и ETag страницы.
+    return queryset.with_user_flags(user).values(
+        *RECIPE_VALUES, 'pub_date', 'updated_at')
+
+
+def recipe_rows(rows, request):
+    """
+    Рецепты в том же виде, что даёт RecipeReadSerializer, но из строк
+    recipe_values(): теги и ингредиенты страницы — ещё два запроса.
+    """
+    rows = list(rows)
+    recipe_ids = [row['id'] for row in rows]
+    tags = defaultdict(list)
+    for row in Tag.objects.filter(recipe__in=recipe_ids).values(
+            'recipe', 'id', 'name', 'slug'):
+        tags[row['recipe']].append(build(TAG_FIELDS, row))
+    ingredients = defaultdict(list)
+    for row in RecipeIngredient.objects.filter(
+            recipe__in=recipe_ids).values(
+                'recipe_id', 'ingredient_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount'):
+        ingredients[row['recipe_id']].append(build(INGREDIENT_FIELDS, row))
+    fields = recipe_fields(request)
+    result = []
+    for row in rows:
+        row['tags'] = tags[row['id']]
+        row['ingredients'] = ingredients[row['id']]
+        result.append(build(fields, row))
+    return result
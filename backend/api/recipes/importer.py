@@ -0,0 +1,163 @@
+import json
+
+from api.pantry import pantry_changed
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from drf_base64.fields import Base64ImageField
+from recipes.feed import fan_out
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, RecipeTags,
+                            Tag)
+from recipes.search import update_search_index
+from rest_framework import serializers
+from users.models import User
+
+from .conditional import recipes_changed
+
+
+class ImportIngredientSerializer(serializers.Serializer):
+    """Ингредиент по id или по паре название + единица измерения."""
+    id = serializers.IntegerField(required=False)
+    name = serializers.CharField(required=False)
+    measurement_unit = serializers.CharField(required=False)
+    amount = serializers.IntegerField(min_value=1)
+
+    def validate(self, obj):
+        if 'id' not in obj and not ('name' in obj
+                                    and 'measurement_unit' in obj):
+            raise serializers.ValidationError(
+                'Укажите id или name и measurement_unit.')
+        return obj
+
+
+class RecipeImportSerializer(serializers.Serializer):
+    """Одна строка импорта рецептов."""
+    name = serializers.CharField(max_length=256)
+    text = serializers.CharField()
+    cooking_time = serializers.IntegerField(min_value=1)
+    image = Base64ImageField(required=False)
+    tags = serializers.ListField(child=serializers.CharField(),
+                                 allow_empty=False)
+    ingredients = ImportIngredientSerializer(many=True, allow_empty=False)
+
+
+class RecipeImporter:
+    """
+    Массовый импорт рецептов из JSON Lines.
+
+    Строки проверяются пачками, теги и ингредиенты пачки находятся
+    заранее, а рецепты пишутся через bulk_create, по транзакции на пачку.
+    Ошибки отдельных строк попадают в отчёт и не мешают остальным.
+    """
+
+    def __init__(self, author, batch_size=500):
+        self.author = author
+        self.batch_size = batch_size
+        self.tags = {}
+        for pk, slug in Tag.objects.values_list('id', 'slug'):
+            self.tags[str(pk)] = pk
+            if slug:
+                self.tags[slug] = pk
+        self.report = {'created': 0, 'failed': 0, 'errors': []}
+
+    def run(self, lines):
+        batch = []
+        for number, line in enumerate(lines, 1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if line.strip():
+                batch.append((number, line))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        self.import_batch(batch)
+        return self.report
+
+    def error(self, number, errors):
+        self.report['failed'] += 1
+        self.report['errors'].append({'line': number, 'errors': errors})
+
+    def import_batch(self, batch):
+        rows = []
+        for number, line in batch:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                self.error(number, 'Некорректный JSON.')
+                continue
+            serializer = RecipeImportSerializer(data=data)
+            if serializer.is_valid():
+                rows.append((number, serializer.validated_data))
+            else:
+                self.error(number, serializer.errors)
+        rows = self.resolve(rows)
+        if not rows:
+            return
+        try:
+            with transaction.atomic():
+                self.write(rows)
+        except DatabaseError as error:
+            for number, _, _, _ in rows:
+                self.error(number, str(error))
+            return
+        self.report['created'] += len(rows)
+
+    def resolve(self, rows):
+        """Заменяет теги и ингредиенты строк на id из базы."""
+        items = [item for _, row in rows for item in row['ingredients']]
+        known_ids = set(Ingredient.objects.filter(
+            id__in={item['id'] for item in items if 'id' in item}
+        ).values_list('id', flat=True))
+        by_name = {
+            (name, unit): pk for pk, name, unit in Ingredient.objects.filter(
+                name__in={item['name'] for item in items if 'id' not in item}
+            ).values_list('id', 'name', 'measurement_unit')}
+        resolved = []
+        for number, row in rows:
+            errors = {}
+            tag_ids = {self.tags.get(tag) for tag in row['tags']}
+            if None in tag_ids:
+                errors['tags'] = 'Один или несколько тегов не существуют.'
+            amounts = {}
+            for item in row['ingredients']:
+                pk = (item['id'] if item.get('id') in known_ids
+                      else by_name.get((item.get('name'),
+                                        item.get('measurement_unit'))))
+                if pk is None:
+                    errors['ingredients'] = (
+                        'Один или несколько ингредиентов не существуют.')
+                elif pk in amounts:
+                    errors['ingredients'] = (
+                        'Ингредиенты должны быть уникальны.')
+                amounts[pk] = item['amount']
+            if errors:
+                self.error(number, errors)
+                continue
+            recipe = Recipe(author=self.author, name=row['name'],
+                            text=row['text'],
+                            cooking_time=row['cooking_time'],
+                            image=row.get('image'),
+                            tag_mask=Recipe.make_tag_mask(tag_ids))
+            resolved.append((number, recipe, tag_ids, amounts))
+        return resolved
+
+    def write(self, rows):
+        recipes = [recipe for _, recipe, _, _ in rows]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            User.objects.filter(pk=self.author.pk).update(
+                recipes_count=F('recipes_count') + len(recipes))
+            transaction.on_commit(lambda: fan_out(recipes))
+        else:
+            # Без RETURNING (SQLite) id новых строк не узнать иначе.
+            for recipe in recipes:
+                recipe.save()
+        RecipeTags.objects.bulk_create(
+            [RecipeTags(recipe=recipe, tag_id=pk)
+             for _, recipe, tag_ids, _ in rows for pk in tag_ids])
+        RecipeIngredient.objects.bulk_create(
+            [RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=amount)
+             for _, recipe, _, amounts in rows
+             for pk, amount in amounts.items()])
+        update_search_index(recipe.pk for recipe in recipes)
+        pantry_changed(*(recipe.pk for recipe in recipes))
+        recipes_changed()
@@ -1,9 +1,13 @@
+from api.pantry import pantry_changed
+from api.users.serializers import UserReadSerializer
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
 from drf_base64.fields import Base64ImageField
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingList, Tag)
+                            RecipeTags, ShoppingList, ShoppingListTotal, Tag)
+from recipes.search import update_search_index
+from recipes.signals import rewriting
 from rest_framework import serializers
-from users.serializers import UserReadSerializer
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -51,7 +55,14 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                   'name', 'image',
                   'text', 'cooking_time')
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return (
             self.context.get('request').user.is_authenticated
             and Favorite.objects.filter(user=self.context['request'].user,
@@ -59,6 +70,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return (
             self.context.get('request').user.is_authenticated
             and ShoppingList.objects.filter(
@@ -67,6 +80,15 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
 
+class PantryRecipeSerializer(RecipeReadSerializer):
+    """[GET] Рецепт из поиска по продуктам."""
+    missing_ingredients = serializers.IntegerField(source='missing',
+                                                   read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + ('missing_ingredients',)
+
+
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
     """Ингредиент и количество для создания рецепта."""
     id = serializers.IntegerField()
@@ -76,10 +98,39 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+class BulkPrimaryKeyRelatedField(serializers.ManyRelatedField):
+    """
+    Список первичных ключей, который проверяется одним запросом, а не
+    запросом на каждый ключ, как PrimaryKeyRelatedField(many=True).
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        pk_field = child.get_queryset().model._meta.pk
+        pks = []
+        for item in data:
+            if isinstance(item, bool):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+            try:
+                pks.append(pk_field.to_python(item))
+            except DjangoValidationError:
+                child.fail('incorrect_type', data_type=type(item).__name__)
+        found = child.get_queryset().in_bulk(pks)
+        for pk in pks:
+            if pk not in found:
+                child.fail('does_not_exist', pk_value=pk)
+        return [found[pk] for pk in pks]
+
+
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """[POST, PATCH, DELETE] Создание, изменение и удаление рецепта."""
-    tags = serializers.PrimaryKeyRelatedField(many=True,
-                                              queryset=Tag.objects.all())
+    tags = BulkPrimaryKeyRelatedField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Tag.objects.all()))
     author = UserReadSerializer(read_only=True)
     id = serializers.ReadOnlyField()
     ingredients = RecipeIngredientCreateSerializer(many=True)
@@ -120,9 +171,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Ингредиенты должны быть уникальны.'
             )
-        ingredient_ids = [item['id'] for item in obj.get('ingredients', [])]
-        if not Ingredient.objects.filter(id__in=ingredient_ids
-                                         ).count() == len(ingredient_ids):
+        if len(Ingredient.objects.in_bulk(ingredient_id_list)) != len(
+                ingredient_id_list):
             raise serializers.ValidationError(
                 {'ingredients':
                  'Один или несколько ингредиентов не существуют.'}
@@ -135,22 +185,52 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def add_tags_and_ingredients_to_recipe(self, recipe, tags, ingredients):
-        recipe.tags.set(tags)
+        """Приводит теги и ингредиенты рецепта к присланным.
+
+        Пишутся только отличия: новые строки, изменённые количества
+        и удалённые позиции.
+        """
+        stored_tags = set(recipe.recipe_tags.values_list('tag_id', flat=True))
+        submitted_tags = {tag.id for tag in tags}
+        RecipeTags.objects.filter(
+            recipe=recipe, tag_id__in=stored_tags - submitted_tags).delete()
+        RecipeTags.objects.bulk_create(
+            [RecipeTags(recipe=recipe, tag_id=pk)
+             for pk in submitted_tags - stored_tags])
+
+        stored = {item.ingredient_id: item for item in recipe.recipes.all()}
+        submitted = {item['id']: item['amount'] for item in ingredients}
+        # Массовые запись и удаление ниже построчных сигналов итогов
+        # корзин не вызывают (rewriting): разница применяется здесь.
+        deltas = dict(submitted)
+        for pk, item in stored.items():
+            deltas[pk] = deltas.get(pk, 0) - item.amount
+        ShoppingListTotal.objects.apply_to_carts(recipe.pk, deltas)
+        RecipeIngredient.objects.filter(
+            recipe=recipe, ingredient_id__in=stored.keys() - submitted.keys()
+        ).delete()
+        changed = []
+        for pk, item in stored.items():
+            if pk in submitted and item.amount != submitted[pk]:
+                item.amount = submitted[pk]
+                changed.append(item)
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
         RecipeIngredient.objects.bulk_create(
-            [RecipeIngredient(
-                recipe=recipe,
-                ingredient=Ingredient.objects.get(pk=ingredient['id']),
-                amount=ingredient['amount']
-            ) for ingredient in ingredients]
-        )
+            [RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=amount)
+             for pk, amount in submitted.items() if pk not in stored])
+        if stored.keys() != submitted.keys():
+            pantry_changed(recipe.pk)
 
     @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(author=self.context['request'].user,
-                                       **validated_data)
+        recipe = Recipe.objects.create(
+            author=self.context['request'].user,
+            tag_mask=Recipe.make_tag_mask(tag.id for tag in tags),
+            **validated_data)
         self.add_tags_and_ingredients_to_recipe(recipe, tags, ingredients)
+        update_search_index([recipe.pk])
         return recipe
 
     @transaction.atomic
@@ -162,13 +242,17 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'cooking_time', instance.cooking_time)
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        RecipeIngredient.objects.filter(
-            recipe=instance,
-            ingredient__in=instance.ingredients.all()).delete()
-        self.add_tags_and_ingredients_to_recipe(instance, tags, ingredients)
+        # save() ниже сдвигает updated_at, индекс пересчитывается после.
+        with rewriting(instance.pk):
+            self.add_tags_and_ingredients_to_recipe(
+                instance, tags, ingredients)
+        instance.tag_mask = Recipe.make_tag_mask(tag.id for tag in tags)
         instance.save()
+        update_search_index([instance.pk])
         return instance
 
     def to_representation(self, instance):
+        instance = Recipe.objects.with_related().with_user_flags(
+            self.context['request'].user).get(pk=instance.pk)
         return RecipeReadSerializer(instance,
                                     context=self.context).data
@@ -0,0 +1,132 @@
+import csv
+import json
+import os
+from html import escape
+from itertools import groupby
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from recipes.models import RecipeIngredient, ShoppingListTotal
+
+TITLE = 'Список покупок'
+
+
+def cart_totals(user):
+    """Суммарное количество каждого ингредиента в корзине."""
+    return (
+        ShoppingListTotal.objects
+        .filter(user=user)
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+        .values_list('ingredient__name', 'amount',
+                     'ingredient__measurement_unit')
+        .iterator()
+    )
+
+
+def cart_recipes(user):
+    """Рецепты корзины со списками ингредиентов."""
+    lines = (
+        RecipeIngredient.objects
+        .filter(recipe__shopping_list__user=user)
+        .order_by('recipe__name', 'recipe_id', 'ingredient__name')
+        .values_list('recipe_id', 'recipe__name', 'ingredient__name',
+                     'amount', 'ingredient__measurement_unit')
+        .iterator()
+    )
+    for (_, recipe), items in groupby(lines, key=lambda line: line[:2]):
+        yield recipe, (item[2:] for item in items)
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_txt(user, by_recipe):
+    yield f'{TITLE}:\n'
+    for ingredient in cart_totals(user):
+        yield '{} - {} {}.\n'.format(*ingredient)
+    if by_recipe:
+        for recipe, ingredients in cart_recipes(user):
+            yield f'\n{recipe}:\n'
+            for ingredient in ingredients:
+                yield '- {}: {} {}\n'.format(*ingredient)
+
+
+def export_csv(user, by_recipe):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('recipe', 'name', 'amount', 'measurement_unit'))
+    for ingredient in cart_totals(user):
+        yield writer.writerow(('', *ingredient))
+    if by_recipe:
+        for recipe, ingredients in cart_recipes(user):
+            for ingredient in ingredients:
+                yield writer.writerow((recipe, *ingredient))
+
+
+def json_ingredients(rows):
+    for index, (name, amount, unit) in enumerate(rows):
+        yield ',' if index else ''
+        yield json.dumps({'name': name, 'amount': amount,
+                          'measurement_unit': unit}, ensure_ascii=False)
+
+
+def export_json(user, by_recipe):
+    yield '{"ingredients": ['
+    yield from json_ingredients(cart_totals(user))
+    yield ']'
+    if by_recipe:
+        yield ', "recipes": ['
+        for index, (recipe, ingredients) in enumerate(cart_recipes(user)):
+            yield ',' if index else ''
+            yield '{"name": %s, "ingredients": [' % json.dumps(
+                recipe, ensure_ascii=False)
+            yield from json_ingredients(ingredients)
+            yield ']}'
+        yield ']'
+    yield '}'
+
+
+def html_rows(rows):
+    for name, amount, unit in rows:
+        yield (f'<tr><td>{escape(name)}</td><td>{amount}</td>'
+               f'<td>{escape(unit)}</td></tr>\n')
+
+
+def export_html(user, by_recipe):
+    yield ('<!DOCTYPE html>\n<html lang="ru"><head><meta charset="utf-8">'
+           f'<title>{TITLE}</title><style>'
+           'body{font-family:sans-serif}table{border-collapse:collapse}'
+           'td{border:1px solid #999;padding:2px 8px}'
+           '</style></head><body>\n'
+           f'<h1>{TITLE}</h1>\n<table>\n')
+    yield from html_rows(cart_totals(user))
+    yield '</table>\n'
+    if by_recipe:
+        for recipe, ingredients in cart_recipes(user):
+            yield f'<h2>{escape(recipe)}</h2>\n<table>\n'
+            yield from html_rows(ingredients)
+            yield '</table>\n'
+    yield '</body></html>\n'
+
+
+EXPORTERS = {
+    'txt': (export_txt, 'text/plain; charset=utf-8'),
+    'csv': (export_csv, 'text/csv; charset=utf-8'),
+    'json': (export_json, 'application/json'),
+    'html': (export_html, 'text/html; charset=utf-8'),
+}
+
+
+def shopping_cart_response(user, file_format, by_recipe=False):
+    """Потоковая выгрузка корзины в выбранном формате."""
+    export, content_type = EXPORTERS[file_format]
+    response = StreamingHttpResponse(export(user, by_recipe),
+                                     content_type=content_type)
+    filename = os.path.splitext(settings.SHOPPING_CART)[0]
+    disposition = 'inline' if file_format == 'html' else 'attachment'
+    response['Content-Disposition'] = (
+        f'{disposition}; filename={filename}.{file_format}')
+    return response
@@ -8,6 +8,7 @@ router.register(
     r'ingredients', views.IngredientViewSet, basename='ingredients')
 router.register(r'tags', views.TagViewSet, basename='tags')
 router.register(r'recipes', views.RecipeViewSet, basename='recipes')
+router.register(r'feed', views.FeedViewSet, basename='feed')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,67 +1,159 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from api.users.serializers import RecipeSerializer
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from foodgram_backend.settings import SHOPPING_CART
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingList, Tag)
+from recipes.feed import timeline
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingList, Tag
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from users.serializers import RecipeSerializer
+from rest_framework.settings import api_settings
 
-from ..filters import RecipeFilter
+from ..cache import ReferenceCacheMixin
+from ..filters import (IngredientSearchFilter, RecipeFilter,
+                       RecipeSearchFilter)
+from ..instrumentation import SerializerTimingMixin, stage, timed
 from ..pagination import RecipePaginator
+from ..pantry import get_pantry_index
 from ..permissions import IsAuthorOrReadOnly
-from .serializers import (IngredientSerializer, RecipeCreateSerializer,
-                          RecipeReadSerializer, TagSerializer)
+from ..renderers import FastJSONRenderer
+from .conditional import ConditionalRecipeMixin
+from .fast_read import recipe_rows, recipe_values
+from .importer import RecipeImporter
+from .serializers import (IngredientSerializer, PantryRecipeSerializer,
+                          RecipeCreateSerializer, RecipeReadSerializer,
+                          TagSerializer)
+from .shopping_cart import EXPORTERS, shopping_cart_response
 
 
 BASE_URL = 'https://foodgram.example.org'
 
 
-class IngredientViewSet(mixins.ListModelMixin,
+class IngredientViewSet(ReferenceCacheMixin,
+                        mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
                         viewsets.GenericViewSet):
     queryset = Ingredient.objects.all()
     permission_classes = (AllowAny, )
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (filters.SearchFilter, )
-    search_fields = ('^name', )
+    filter_backends = (IngredientSearchFilter, )
+    cache_query_params = (api_settings.SEARCH_PARAM, )
+    # С версией справочника, которую воркер перечитывает раз в
+    # REFERENCE_STAMP_TIMEOUT секунд.
+    query_budget = {'list': 4, 'retrieve': 3}
 
 
-class TagViewSet(mixins.ListModelMixin,
+class TagViewSet(ReferenceCacheMixin,
+                 mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  viewsets.GenericViewSet):
     permission_classes = (AllowAny, )
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    query_budget = {'list': 3, 'retrieve': 3}
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class FeedViewSet(SerializerTimingMixin, viewsets.GenericViewSet):
+    """Лента рецептов авторов, на которых подписан пользователь."""
+    permission_classes = (IsAuthenticated, )
+    serializer_class = RecipeReadSerializer
+    pagination_class = RecipePaginator
+    query_budget = {'list': 6}
+
+    def list(self, request):
+        queryset = Recipe.objects.defer('search_vector').with_related(
+        ).with_user_flags(request.user)
+
+        def fetch(position, limit):
+            ids = timeline(request.user, limit, position)
+            recipes = queryset.in_bulk(ids)
+            return [recipes[pk] for pk in ids if pk in recipes]
+
+        page = self.paginator.paginate_by_key(request, Recipe, fetch)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class RecipeViewSet(ConditionalRecipeMixin, SerializerTimingMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     pagination_class = RecipePaginator
     permission_classes = (IsAuthorOrReadOnly, )
-    filter_backends = (DjangoFilterBackend, )
+    filter_backends = (DjangoFilterBackend, RecipeSearchFilter,
+                       filters.OrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
     http_method_names = ['get', 'post', 'patch', 'create', 'delete']
+    # Число SQL на запрос (см. api.budgets, check_query_budgets). Запись
+    # от числа тегов и ингредиентов не зависит, но дороже для рецептов в
+    # корзинах и авторов с подписчиками: create, partial_update и destroy
+    # взяты по максимуму run_benchmark на данных seed_benchmark.
+    query_budget = {
+        'list': 8, 'retrieve': 5, 'create': 23, 'partial_update': 28,
+        'destroy': 24, 'add_to_favorites': 7, 'remove_from_favorites': 7,
+        'add_to_shopping_cart': 12, 'remove_from_shopping_cart': 11,
+        'download_shopping_cart': 3, 'bulk_import': 19, 'pantry': 5,
+        'similar': 3, 'get_link': 2,
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset().defer('search_vector')
+        if self.action == 'list' and settings.RECIPE_FAST_READ:
+            return queryset
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_related().with_user_flags(
+                self.request.user)
+        return queryset
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if not settings.RECIPE_FAST_READ:
+            return renderers
+        return [FastJSONRenderer() if type(renderer) is JSONRenderer
+                else renderer for renderer in renderers]
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_list(
+            self.list_response, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.retrieve_validator(request), super().retrieve,
+            request, *args, **kwargs)
+
+    def list_response(self, request, *args, **kwargs):
+        if not settings.RECIPE_FAST_READ:
+            return super().list(request, *args, **kwargs)
+        queryset = recipe_values(
+            self.filter_queryset(self.get_queryset()), request.user)
+        page = self.paginate_queryset(queryset)
+        with stage('serialize'):
+            data = recipe_rows(queryset if page is None else page, request)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeReadSerializer
         return RecipeCreateSerializer
 
+    @transaction.atomic
     def add_to_list(self, request, model, recipe, error_message):
         if not model.objects.filter(user=request.user, recipe=recipe).exists():
             model.objects.create(user=request.user, recipe=recipe)
-            serializer = RecipeSerializer(recipe, context={"request": request})
+            serializer = timed(RecipeSerializer(
+                recipe, context={"request": request}))
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response({'errors': error_message},
                         status=status.HTTP_400_BAD_REQUEST)
 
+    @transaction.atomic
     def remove_from_list(self, request, model,
                          recipe, success_message, error_message):
         item = model.objects.filter(user=request.user, recipe=recipe).first()
@@ -107,21 +199,65 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'],
             permission_classes=(IsAuthenticated,))
     def download_shopping_cart(self, request, **kwargs):
-        ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__shoppinglist__user=request.user)
-            .values('ingredient')
-            .annotate(total_amount=Sum('amount'))
-            .values_list('ingredient__name', 'total_amount',
-                         'ingredient__measurement_unit')
-        )
-        file_list = []
-        [file_list.append(
-            '{} - {} {}.'.format(*ingredient)) for ingredient in ingredients]
-        file = HttpResponse('Cписок покупок:\n' + '\n'.join(file_list),
-                            content_type='text/plain')
-        file['Content-Disposition'] = (f'attachment; filename={SHOPPING_CART}')
-        return file
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in EXPORTERS:
+            return Response(
+                {'errors': 'Доступные форматы: '
+                           f'{", ".join(EXPORTERS)}.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        by_recipe = request.query_params.get('by_recipe') in ('1', 'true')
+        return shopping_cart_response(request.user, file_format, by_recipe)
+
+    @action(detail=False, methods=['post'], url_path='import',
+            permission_classes=(IsAuthenticated,))
+    def bulk_import(self, request):
+        """Импорт рецептов из тела запроса в формате JSON Lines."""
+        if request.stream is None:
+            return Response({'errors': 'Пустое тело запроса.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        report = RecipeImporter(request.user).run(request.stream)
+        return Response(report, status=(
+            status.HTTP_201_CREATED if report['created']
+            else status.HTTP_400_BAD_REQUEST))
+
+    @action(detail=False, methods=['get'])
+    def pantry(self, request):
+        """Рецепты из имеющихся продуктов: сначала те, где хватает всего."""
+        values = ','.join(request.query_params.getlist('ingredients'))
+        try:
+            ingredient_ids = {int(pk) for pk in values.split(',') if pk}
+        except ValueError:
+            ingredient_ids = None
+        if not ingredient_ids:
+            return Response(
+                {'errors': 'Укажите id ингредиентов в параметре '
+                           'ingredients.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(
+            get_pantry_index().search(ingredient_ids))
+        recipes = Recipe.objects.with_related().with_user_flags(
+            request.user).in_bulk([pk for pk, _ in page])
+        found = []
+        for pk, missing in page:
+            if pk in recipes:
+                recipes[pk].missing = missing
+                found.append(recipes[pk])
+        serializer = timed(PantryRecipeSerializer(
+            found, many=True, context=self.get_serializer_context()))
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'], permission_classes=(AllowAny,))
+    def similar(self, request, pk=None):
+        """Похожие рецепты по ингредиентам и тегам."""
+        recipe = get_object_or_404(Recipe, id=pk)
+        ids = list(recipe.similar.order_by('-score').values_list(
+            'similar_id', flat=True)[:settings.SIMILAR_RECIPES_COUNT])
+        recipes = Recipe.objects.defer('search_vector').with_related(
+        ).with_user_flags(request.user).in_bulk(ids)
+        serializer = timed(RecipeReadSerializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True,
+            context=self.get_serializer_context()))
+        return Response(serializer.data)
 
     @action(
         methods=['get'],
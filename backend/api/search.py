@@ -0,0 +1,147 @@
+import math
+import re
+import threading
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+
+from .cache import get_stamp
+
+SPACES = re.compile(r'\s+')
+SIMILARITY_THRESHOLD = 0.3
+
+
+def normalize(text):
+    """Нижний регистр, ё → е, схлопнутые пробелы."""
+    return SPACES.sub(' ', text.lower().replace('ё', 'е')).strip()
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientIndex:
+    """
+    Индекс названий ингредиентов для автодополнения.
+
+    Сначала идут совпадения по началу названия, затем по подстроке,
+    затем названия со словами, похожими на запрос по триграммам
+    (как pg_trgm). Нечёткий поиск идёт по словарю слов, а не по полным
+    названиям: словарь на порядки меньше таблицы.
+    """
+
+    def __init__(self, rows):
+        self.entries = sorted((normalize(name), pk) for pk, name in rows)
+        self.names = [name for name, _ in self.entries]
+        self.words = {}
+        for position, name in enumerate(self.names):
+            for word in dict.fromkeys(name.split()):
+                if any(char.isalpha() for char in word):
+                    self.words.setdefault(word, []).append(position)
+        self.grams = {word: trigrams(word) for word in self.words}
+        # Списки слов по триграммам упорядочены по числу триграмм в слове:
+        # заведомо слишком короткие и длинные слова отсекаются бинарным
+        # поиском.
+        self.postings = {}
+        for word, grams in self.grams.items():
+            for gram in grams:
+                self.postings.setdefault(gram, []).append((len(grams), word))
+        for posting in self.postings.values():
+            posting.sort()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def prefix(self, query):
+        start = bisect_left(self.names, query)
+        return range(start, bisect_left(self.names, query + '\uffff', start))
+
+    def substring(self, query, limit):
+        if len(query) < 3 or ' ' in query:
+            # Короткие запросы и запросы из нескольких слов: просматриваем
+            # названия по алфавиту до первых limit совпадений.
+            matches = []
+            for position, name in enumerate(self.names):
+                offset = name.find(query)
+                if offset > 0:
+                    matches.append((offset, position))
+                    if len(matches) == limit:
+                        break
+        else:
+            positions = set()
+            for word, word_positions in self.words.items():
+                if query in word:
+                    positions.update(word_positions)
+            matches = [(self.names[position].find(query), position)
+                       for position in positions]
+            matches = [match for match in matches if match[0] > 0]
+        return [position for _, position in sorted(matches)[:limit]]
+
+    def similar(self, query, exclude, limit):
+        query_grams = trigrams(query)
+        # Похожее слово обязано делить с запросом хотя бы required
+        # триграмм, значит оно встретится среди самых редких из них.
+        required = math.ceil(SIMILARITY_THRESHOLD * len(query_grams)
+                             / (1 + SIMILARITY_THRESHOLD))
+        rare = sorted(query_grams, key=lambda gram: len(
+            self.postings.get(gram, ())))[:len(query_grams) - required + 1]
+        bounds = ((math.ceil(SIMILARITY_THRESHOLD * len(query_grams)), ''),
+                  (len(query_grams) / SIMILARITY_THRESHOLD, '\uffff'))
+        candidates = set()
+        for gram in rare:
+            posting = self.postings.get(gram, [])
+            candidates.update(
+                word for _, word in
+                posting[bisect_left(posting, bounds[0]):
+                        bisect_left(posting, bounds[1])])
+        scored = []
+        for word in candidates:
+            common = len(query_grams & self.grams[word])
+            similarity = common / (
+                len(query_grams) + len(self.grams[word]) - common)
+            if similarity >= SIMILARITY_THRESHOLD:
+                scored.append((-similarity, word))
+        found = []
+        for _, word in sorted(scored):
+            for position in self.words[word]:
+                if position not in exclude:
+                    exclude.add(position)
+                    found.append(position)
+                    if len(found) == limit:
+                        return found
+        return found
+
+    def search(self, query, limit):
+        """Идентификаторы ингредиентов в порядке релевантности."""
+        query = normalize(query)
+        if not query:
+            return []
+        found = list(self.prefix(query)[:limit])
+        if len(found) < limit:
+            found += self.substring(query, limit - len(found))
+        if len(found) < limit:
+            found += self.similar(query, set(found), limit - len(found))
+        return [self.entries[position][1] for position in found]
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_ingredient_index():
+    """
+    Индекс, перестроенный после изменения таблицы ингредиентов. Версия
+    справочника хранится в базе, поэтому загрузка из другого процесса
+    (db_ingredients, админка) видна не позже REFERENCE_STAMP_TIMEOUT.
+    """
+    global _index, _index_version
+    version, _ = get_stamp(Ingredient)
+    if _index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                _index = IngredientIndex(
+                    Ingredient.objects.values_list('id', 'name').iterator())
+                _index_version = version
+    return _index
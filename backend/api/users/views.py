@@ -1,23 +1,40 @@
 from api.pagination import RecipePaginator
+from django.db.models import Exists, OuterRef
 from django.shortcuts import get_object_or_404
+from recipes.models import Recipe
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from users.models import Subscribe, User
 
+from ..instrumentation import SerializerTimingMixin, timed
 from .serializers import (AuthorSubscriptionSerializer, SetPasswordSerializer,
                           SubscriptionsSerializer, UserAvatarSerializer,
                           UserCreateSerializer, UserReadSerializer)
 
 
-class UserViewSet(mixins.CreateModelMixin,
+class UserViewSet(SerializerTimingMixin,
+                  mixins.CreateModelMixin,
                   mixins.ListModelMixin,
                   mixins.RetrieveModelMixin,
                   viewsets.GenericViewSet):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
     pagination_class = RecipePaginator
+    cursor_ordering = ('id',)
+    query_budget = {
+        'list': 3, 'retrieve': 2, 'create': 6, 'me': 1, 'subscriptions': 4,
+        'subscribe': 10, 'avatar': 5, 'set_password': 3,
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action in ('list', 'retrieve') and user.is_authenticated:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscribe.objects.filter(user=user, author=OuterRef('pk'))))
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -28,7 +45,7 @@ class UserViewSet(mixins.CreateModelMixin,
             pagination_class=None,
             permission_classes=(IsAuthenticated,))
     def me(self, request):
-        serializer = UserReadSerializer(request.user)
+        serializer = timed(UserReadSerializer(request.user))
         return Response(serializer.data,
                         status=status.HTTP_200_OK)
 
@@ -47,8 +64,16 @@ class UserViewSet(mixins.CreateModelMixin,
     def subscriptions(self, request):
         queryset = User.objects.filter(subscribing__user=request.user)
         page = self.paginate_queryset(queryset)
-        serializer = SubscriptionsSerializer(page, many=True,
-                                             context={'request': request})
+        try:
+            limit = max(int(request.GET['recipes_limit']), 0)
+        except (KeyError, ValueError):
+            limit = None
+        previews = Recipe.objects.latest_by_author(
+            [author.id for author in page], limit)
+        for author in page:
+            author.recipes_preview = previews[author.id]
+        serializer = timed(SubscriptionsSerializer(
+            page, many=True, context={'request': request}))
         return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post', 'delete'],
@@ -65,8 +90,8 @@ class UserViewSet(mixins.CreateModelMixin,
                                         author=author).exists():
                 return Response({'errors': 'Подписка уже существует.'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            serializer = AuthorSubscriptionSerializer(
-                author, data=request.data, context={"request": request})
+            serializer = timed(AuthorSubscriptionSerializer(
+                author, data=request.data, context={"request": request}))
             serializer.is_valid(raise_exception=True)
             Subscribe.objects.create(user=request.user, author=author)
             return Response(serializer.data,
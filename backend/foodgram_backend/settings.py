@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -36,6 +37,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.budgets.QueryBudgetMiddleware',
+    'api.instrumentation.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +85,44 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Теги и ингредиенты. С LocMemCache каждый воркер gunicorn держит свою
+# копию ответов; версия справочника хранится в базе (ReferenceVersion) и
+# перечитывается раз в REFERENCE_STAMP_TIMEOUT секунд, так что изменения
+# из других процессов (админка, db_ingredients) видны не позже этого.
+# С общим бэкендом кэша сброс виден сразу.
+REFERENCE_CACHE_ALIAS = 'default'
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+REFERENCE_STAMP_TIMEOUT = 10
+
+# Токен и пользователь для CachedTokenAuthentication. С общим бэкендом
+# кэша (memcached, redis) записи хранятся в нём и при выходе, смене
+# пароля и деактивации сбрасываются сразу во всех воркерах. Без алиаса —
+# LRU в каждом воркере: там сброс виден только своему воркеру, а в
+# остальных удалённый токен или отключённый пользователь ещё
+# TOKEN_CACHE_TIMEOUT секунд проходят аутентификацию. Поэтому срок для
+# LRU по умолчанию — несколько секунд: это окно уязвимости в обмен на
+# запрос к базе раз в несколько секунд на токен, а не на каждый запрос.
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',
+                        'django.core.cache.backends.dummy.DummyCache')
+TOKEN_CACHE_ALIAS = os.getenv(
+    'TOKEN_CACHE_ALIAS',
+    '' if CACHES['default']['BACKEND'] in LOCAL_CACHE_BACKENDS else 'default')
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TIMEOUT = int(os.getenv(
+    'TOKEN_CACHE_TIMEOUT', '60' if TOKEN_CACHE_ALIAS else '5'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -135,7 +177,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -154,3 +196,58 @@ DJOSER = {
 
 
 SHOPPING_CART = 'shopping_cart.txt'
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+# Журнал изменений рецептов для индексов продуктов в памяти воркеров:
+# срок хранения записей, период опроса журнала и задержка, после которой
+# запись считается окончательной (id выдаются до фиксации транзакций).
+PANTRY_JOURNAL_TIMEOUT = 7 * 86400
+PANTRY_POLL_INTERVAL = 5
+PANTRY_JOURNAL_SETTLE = 2
+
+# Авторам с большим числом подписчиков лента собирается при чтении.
+FEED_FANOUT_LIMIT = 5000
+FEED_BATCH_SIZE = 1000
+
+SIMILAR_RECIPES_COUNT = 10
+SIMILARITY_TAG_WEIGHT = 0.5
+SIMILARITY_POSTING_LIMIT = 2000
+
+# Список рецептов строится из строк values() и отдаётся через orjson
+# (если установлен); 'false' возвращает сериализаторы DRF.
+RECIPE_FAST_READ = os.getenv('RECIPE_FAST_READ', 'true').lower() == 'true'
+
+# Доля запросов с замерами SQL и этапов (Server-Timing, лог api.timing);
+# повтор одного SQL REQUEST_TIMING_REPEATS раз попадает в отчёт о N+1.
+REQUEST_TIMING_SAMPLE_RATE = float(
+    os.getenv('REQUEST_TIMING_SAMPLE_RATE', '0.05'))
+REQUEST_TIMING_REPEATS = 3
+
+# Файлы метрик воркеров gunicorn, общие для /internal/metrics/.
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_metrics'))
+
+# Бюджеты SQL view (атрибут query_budget): '' — не проверять,
+# 'warn' — писать превышения в лог, 'strict' — ронять запрос.
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'api.budgets': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
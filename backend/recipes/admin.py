@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingList, Tag)
+                     RecipeTags, ShoppingList, Tag)
+from .search import update_search_index
 
 
 class BaseAdminSettings(admin.ModelAdmin):
@@ -30,22 +31,34 @@ class IngredientAdmin(BaseAdminSettings):
     list_filter = ('name',)
 
 
+class RecipeTagsInline(admin.TabularInline):
+    """Теги рецепта."""
+    model = RecipeTags
+    extra = 1
+
+
 @admin.register(Recipe)
 class RecipeAdmin(BaseAdminSettings):
     """
     Управление рецептами.
     """
-    list_display = ('name', 'author', 'added_in_favorites')
+    list_display = ('name', 'author', 'added_in_favorites', 'in_carts_count')
     list_display_links = ('name',)
     search_fields = ('name',)
     list_filter = ('author', 'name', 'tags')
     readonly_fields = ('added_in_favorites',)
-    filter_horizontal = ('tags',)
+    inlines = (RecipeTagsInline,)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.refresh_tag_mask()
+        update_search_index([form.instance.pk])
 
     def added_in_favorites(self, obj):
-        return obj.favorites.all().count()
+        return obj.favorites_count
 
     added_in_favorites.short_description = 'Количество добавлений в избранное'
+    added_in_favorites.admin_order_field = 'favorites_count'
 
 
 @admin.register(RecipeIngredient)
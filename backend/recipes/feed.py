@@ -0,0 +1,111 @@
+from heapq import merge
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from users.models import Subscribe, User
+
+from .models import FeedEntry, Recipe
+
+
+def is_fanned_out(author_id):
+    """Рецепты авторов с огромным числом подписчиков не раздаются."""
+    return User.objects.filter(
+        pk=author_id,
+        followers_count__lte=settings.FEED_FANOUT_LIMIT).exists()
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def fan_out(recipes):
+    """Раздаёт новые рецепты в ленты подписчиков их авторов пачками."""
+    by_author = {}
+    for recipe in recipes:
+        by_author.setdefault(recipe.author_id, []).append(recipe)
+    for author_id, author_recipes in by_author.items():
+        if not is_fanned_out(author_id):
+            continue
+        followers = Subscribe.objects.filter(author_id=author_id).values_list(
+            'user_id', flat=True).iterator()
+        for users in batches(followers, settings.FEED_BATCH_SIZE):
+            FeedEntry.objects.bulk_create(
+                [FeedEntry(user_id=user_id, recipe=recipe,
+                           author_id=author_id, pub_date=recipe.pub_date)
+                 for user_id in users for recipe in author_recipes],
+                ignore_conflicts=True)
+
+
+def push_recipes(user_ids, author_id):
+    """Добавляет все рецепты автора в ленты user_ids пачками."""
+    recipes = list(Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'))
+    entries = (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                         author_id=author_id, pub_date=pub_date)
+               for user_id in user_ids for recipe_id, pub_date in recipes)
+    for batch in batches(entries, settings.FEED_BATCH_SIZE):
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту нового подписчика уже вышедшие рецепты автора."""
+    if is_fanned_out(author_id):
+        push_recipes([user_id], author_id)
+
+
+def restore(author_id):
+    """
+    Автор вернулся к FEED_FANOUT_LIMIT подписчиков: его рецепты больше не
+    читаются в момент запроса, поэтому вышедшие без раздачи добавляются
+    в ленты всех подписчиков.
+    """
+    if User.objects.filter(
+            pk=author_id,
+            followers_count=settings.FEED_FANOUT_LIMIT).exists():
+        push_recipes(Subscribe.objects.filter(author_id=author_id)
+                     .values_list('user_id', flat=True).iterator(),
+                     author_id)
+
+
+def prune(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def before(position, id_field):
+    """Строго раньше позиции (pub_date, id) в порядке ленты."""
+    pub_date, pk = position
+    return Q(pub_date__lte=pub_date) & (
+        Q(pub_date__lt=pub_date) | Q(**{f'{id_field}__lt': pk}))
+
+
+def timeline(user, limit, position=None):
+    """
+    Id рецептов ленты от новых к старым: раздача из таблицы ленты плюс
+    рецепты авторов без раздачи, прочитанные в момент запроса.
+    """
+    entries = FeedEntry.objects.filter(user=user)
+    if position:
+        entries = entries.filter(before(position, 'recipe_id'))
+    pushed = entries.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit]
+    authors = Subscribe.objects.filter(
+        user=user, author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).values_list('author_id', flat=True)
+    pulled = Recipe.objects.filter(author__in=authors)
+    if position:
+        pulled = pulled.filter(before(position, 'id'))
+    pulled = pulled.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id')[:limit]
+    found = []
+    for _, recipe_id in merge(pushed, pulled, reverse=True):
+        if recipe_id not in found:
+            found.append(recipe_id)
+            if len(found) == limit:
+                break
+    return found
@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from recipes.models import Recipe, SimilarRecipe
+from recipes.similarity import (SimilarityMatrix, features, offer_neighbours,
+                                save_neighbours)
+
+
+class Command(BaseCommand):
+    help = ('Расчёт похожих рецептов по ингредиентам и тегам. Без '
+            'аргументов пересчитываются все рецепты; с --recipes и '
+            '--missing — только указанные и ещё не посчитанные, а они '
+            'сами добавляются в списки своих соседей. Из чужих списков '
+            'изменённый рецепт уходит только при полном пересчёте.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int,
+                            default=settings.SIMILAR_RECIPES_COUNT)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, nargs='+', default=(),
+                            help='id изменённых рецептов.')
+        parser.add_argument('--missing', action='store_true',
+                            help='Рецепты, для которых соседей ещё нет.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        matrix = SimilarityMatrix(features())
+        self.stdout.write(
+            f'Матрица: {len(matrix)} рецептов, {len(matrix.indices)} '
+            f'признаков за {time.perf_counter() - started:.1f} с')
+        incremental = options['recipes'] or options['missing']
+        if incremental:
+            recipe_ids = set(options['recipes'])
+            if options['missing']:
+                recipe_ids.update(Recipe.objects.filter(~Exists(
+                    SimilarRecipe.objects.filter(recipe=OuterRef('pk')))
+                ).values_list('id', flat=True))
+            rows = sorted(row for row in map(matrix.find, recipe_ids)
+                          if row is not None)
+            # Рецепты без ингредиентов и тегов ни на что не похожи.
+            SimilarRecipe.objects.filter(recipe_id__in=recipe_ids).exclude(
+                recipe_id__in=[matrix.ids[row] for row in rows]).delete()
+        else:
+            rows = range(len(matrix))
+        chunk_size = options['chunk_size']
+        for start in range(0, len(rows), chunk_size):
+            found = save_neighbours(
+                matrix, rows[start:start + chunk_size], options['count'])
+            if incremental:
+                offer_neighbours(found, options['count'])
+            self.stdout.write(
+                f'Обработано рецептов: {min(start + chunk_size, len(rows))}'
+                f' из {len(rows)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты посчитаны за '
+            f'{time.perf_counter() - started:.1f} с.'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Recipe, RecipeTags
+
+
+class Command(BaseCommand):
+    help = 'Сверка битовых масок тегов рецептов с таблицей связей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать расхождения.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = stale = 0
+        last_id = 0
+        while True:
+            recipes = dict(
+                Recipe.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', 'tag_mask')[:batch_size])
+            if not recipes:
+                break
+            last_id = max(recipes)
+            expected = dict.fromkeys(recipes, 0)
+            for recipe_id, tag_id in RecipeTags.objects.filter(
+                    recipe_id__gte=min(recipes), recipe_id__lte=last_id
+            ).values_list('recipe_id', 'tag_id'):
+                if recipe_id in expected:
+                    expected[recipe_id] |= Recipe.make_tag_mask((tag_id,))
+            wrong = [Recipe(pk=pk, tag_mask=mask)
+                     for pk, mask in expected.items() if recipes[pk] != mask]
+            if wrong and not options['dry_run']:
+                with transaction.atomic():
+                    Recipe.objects.bulk_update(wrong, ['tag_mask'])
+            checked += len(recipes)
+            stale += len(wrong)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено рецептов: {checked}, расхождений: {stale}'
+            f'{" (не исправлены)" if options["dry_run"] and stale else ""}.'))
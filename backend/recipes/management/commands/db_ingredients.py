@@ -1,17 +1,109 @@
+import csv
 import json
 import os
+import time
 
-from django.core.management.base import BaseCommand
+from api.cache import invalidate_reference
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from recipes.models import Ingredient
 
 
+def iter_json(file, chunk_size=64 * 1024):
+    """Элементы JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидался JSON-массив.')
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Файл JSON оборван или повреждён.')
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item['name'], item['measurement_unit']
+        buffer = buffer[end:]
+
+
+def iter_csv(file):
+    for name, measurement_unit in csv.reader(file):
+        yield name, measurement_unit
+
+
 class Command(BaseCommand):
-    help = 'Загрузка ингредиентов из data/ingredients.json'
-
-    def handle(self, *args, **kwargs):
-        file_path = os.path.join('data', 'ingredients.json')
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            for item in data:
-                Ingredient.objects.get_or_create(name=item['name'])
-        self.stdout.write(self.style.SUCCESS('Ингредиенты успешно загружены!'))
+    help = 'Загрузка ингредиентов из data/ingredients.json или .csv'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?',
+                            default=os.path.join('data', 'ingredients.json'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Посчитать изменения, ничего не записывая.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        started = time.perf_counter()
+        self.created = self.updated = self.skipped = 0
+        keys = set(Ingredient.objects.values_list('name', 'measurement_unit'))
+        # Старая версия команды не сохраняла единицы измерения:
+        # такие записи дополняем, а не дублируем.
+        without_unit = dict(Ingredient.objects.filter(
+            measurement_unit='').values_list('name', 'pk'))
+        to_create, to_update = [], []
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            before = Ingredient.objects.count()
+            rows = iter_csv(file) if path.endswith('.csv') else iter_json(file)
+            for name, measurement_unit in rows:
+                name, measurement_unit = name.strip(), measurement_unit.strip()
+                if (name, measurement_unit) in keys:
+                    self.skipped += 1
+                    continue
+                keys.add((name, measurement_unit))
+                if name in without_unit:
+                    to_update.append(Ingredient(
+                        pk=without_unit.pop(name),
+                        measurement_unit=measurement_unit))
+                else:
+                    to_create.append(Ingredient(
+                        name=name, measurement_unit=measurement_unit))
+                if len(to_create) + len(to_update) >= batch_size:
+                    self.flush(to_create, to_update, dry_run)
+            self.flush(to_create, to_update, dry_run)
+            if not dry_run:
+                # bulk_create(ignore_conflicts=True) молча пропускает строки,
+                # вставленные параллельно: добавленные считаются по таблице.
+                created = Ingredient.objects.count() - before
+                self.skipped += self.created - created
+                self.created = created
+        if not dry_run and (self.created or self.updated):
+            invalidate_reference(Ingredient)
+        elapsed = time.perf_counter() - started
+        total = self.created + self.updated + self.skipped
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверка завершена" if dry_run else "Ингредиенты загружены"}: '
+            f'добавлено {self.created}, обновлено {self.updated}, '
+            f'пропущено {self.skipped} за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с).'))
+
+    def flush(self, to_create, to_update, dry_run):
+        if not dry_run:
+            Ingredient.objects.bulk_create(to_create, ignore_conflicts=True)
+            Ingredient.objects.bulk_update(to_update, ['measurement_unit'])
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        to_create.clear()
+        to_update.clear()
+        self.stdout.write(
+            f'Обработано строк: '
+            f'{self.created + self.updated + self.skipped}')
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingList
+from users.models import Subscribe, User
+
+
+def related_count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingList, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribe, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Сверка денормализованных счётчиков (избранное, корзины, '
+            'рецепты, подписчики) с фактическими данными.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать расхождения.')
+
+    def handle(self, *args, **options):
+        for model, field, related, lookup in COUNTERS:
+            actual = related_count(related, lookup)
+            with transaction.atomic():
+                stale = model.objects.annotate(actual=actual).exclude(
+                    **{field: F('actual')}).values_list('pk', flat=True)
+                fixed = stale.count()
+                if fixed and not options['dry_run']:
+                    model.objects.filter(pk__in=list(stale)).update(
+                        **{field: actual})
+            self.stdout.write(
+                f'{model._meta.label}.{field}: расхождений {fixed}')
+        self.stdout.write(self.style.SUCCESS('Сверка счётчиков завершена.'))
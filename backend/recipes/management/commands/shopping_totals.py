@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import ShoppingListTotal
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт сводных списков покупок по корзинам. С --verify '
+            'только сверяет сохранённые суммы и сообщает о расхождениях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            return self.verify()
+        with transaction.atomic():
+            ShoppingListTotal.objects.all().delete()
+            batch = []
+            created = 0
+            for user_id, ingredient_id, total in (
+                    ShoppingListTotal.objects.expected().iterator()):
+                batch.append(ShoppingListTotal(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    amount=total))
+                if len(batch) >= options['batch_size']:
+                    created += len(batch)
+                    ShoppingListTotal.objects.bulk_create(batch)
+                    batch = []
+            created += len(batch)
+            ShoppingListTotal.objects.bulk_create(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги корзин пересчитаны: {created} строк.'))
+
+    def verify(self):
+        expected = {
+            (user_id, ingredient_id): total for user_id, ingredient_id, total
+            in ShoppingListTotal.objects.expected().iterator()}
+        drift = 0
+        for user_id, ingredient_id, amount in (
+                ShoppingListTotal.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount').iterator()):
+            total = expected.pop((user_id, ingredient_id), 0)
+            if total != amount:
+                drift += 1
+                self.stdout.write(
+                    f'user={user_id} ingredient={ingredient_id}: '
+                    f'сохранено {amount}, должно быть {total}')
+        for (user_id, ingredient_id), total in expected.items():
+            drift += 1
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'нет строки, должно быть {total}')
+        if drift:
+            raise CommandError(f'Расхождений: {drift}.')
+        self.stdout.write(self.style.SUCCESS('Итоги корзин совпадают.'))
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.16 on 2026-10-18 16:38
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit').annotate(
+        keep_id=Min('id'), count=Count('id')).filter(count__gt=1)
+    for group in duplicates:
+        keep_id = group['keep_id']
+        extra_ids = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit'],
+        ).exclude(id=keep_id).values_list('id', flat=True))
+        # Рецепт с двумя дублями: количества складываются в одну строку
+        # (recipe, ingredient уникальны), остальные строки переносятся.
+        kept = {item.recipe_id: item for item in RecipeIngredient.objects
+                .filter(ingredient_id=keep_id)}
+        for item in RecipeIngredient.objects.filter(
+                ingredient_id__in=extra_ids).order_by('id'):
+            if item.recipe_id in kept:
+                kept[item.recipe_id].amount += item.amount
+                kept[item.recipe_id].save(update_fields=['amount'])
+                item.delete()
+            else:
+                item.ingredient_id = keep_id
+                item.save(update_fields=['ingredient'])
+                kept[item.recipe_id] = item
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # Отложенные проверки внешних ключей — сейчас: иначе ALTER TABLE
+        # ниже упадёт на «pending trigger events».
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipetags'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
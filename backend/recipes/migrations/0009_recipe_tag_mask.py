@@ -0,0 +1,41 @@
+# Generated by Django 3.2.16 on 2026-10-18 16:47
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+TAG_MASK_BITS = 63
+
+
+def fill_tag_masks(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeTags = apps.get_model('recipes', 'RecipeTags')
+    links = RecipeTags.objects.order_by('recipe_id').values_list(
+        'recipe_id', 'tag_id').iterator()
+    batch = []
+    for recipe_id, rows in groupby(links, key=lambda row: row[0]):
+        mask = 0
+        for _, tag_id in rows:
+            if 0 < tag_id < TAG_MASK_BITS:
+                mask |= 1 << tag_id
+        batch.append(Recipe(pk=recipe_id, tag_mask=mask))
+        if len(batch) >= 1000:
+            Recipe.objects.bulk_update(batch, ['tag_mask'])
+            batch = []
+    Recipe.objects.bulk_update(batch, ['tag_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Битовая маска тегов'),
+        ),
+        migrations.RunPython(fill_tag_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.16 on 2026-10-18 16:58
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRESQL_FORWARD = (
+    'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+    'USING gin (search_vector)',
+    "UPDATE recipes_recipe AS r SET search_vector = "
+    "setweight(to_tsvector('russian', COALESCE(r.name, '')), 'A') || "
+    "setweight(to_tsvector('russian', COALESCE(r.text, '')), 'B') || "
+    "setweight(to_tsvector('russian', COALESCE(("
+    "SELECT string_agg(i.name, ' ') FROM recipes_recipeingredient ri "
+    "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = r.id), '')), 'C')",
+)
+POSTGRESQL_BACKWARD = ('DROP INDEX IF EXISTS recipe_search_vector_idx',)
+SQLITE_FORWARD = (
+    'CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5('
+    'name, text, ingredients, '
+    "tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients) "
+    "SELECT r.id, r.name, r.text, COALESCE(("
+    "SELECT group_concat(i.name, ' ') FROM recipes_recipeingredient ri "
+    "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = r.id), '') FROM recipes_recipe r",
+)
+SQLITE_BACKWARD = ('DROP TABLE IF EXISTS recipes_recipe_fts',)
+
+
+def run(statements):
+    def execute(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, ()):
+            schema_editor.execute(sql)
+    return execute
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_tag_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        # GIN-индекс есть только в PostgreSQL, FTS5 — только в SQLite.
+        migrations.RunPython(
+            run({'postgresql': POSTGRESQL_FORWARD,
+                 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRESQL_BACKWARD,
+                 'sqlite': SQLITE_BACKWARD})),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:37
+
+from django.db import migrations, models
+import django.utils.timezone
+
+REFERENCES = ('recipes.tag', 'recipes.ingredient')
+
+
+def create_versions(apps, schema_editor):
+    ReferenceVersion = apps.get_model('recipes', 'ReferenceVersion')
+    ReferenceVersion.objects.bulk_create(
+        [ReferenceVersion(name=name) for name in REFERENCES])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='Справочник')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия справочника',
+                'verbose_name_plural': 'Версии справочников',
+            },
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,12 @@
+import threading
+from contextlib import contextmanager
+
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
-from users.models import User
+from django.db import models, transaction
+from django.db.models import Case, Exists, F, OuterRef, Prefetch, Value, When
+from django.utils import timezone
+from users.models import Subscribe, User
 
 
 class Ingredient(models.Model):
@@ -17,6 +23,12 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Ингридиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -43,6 +55,93 @@ class Tag(models.Model):
         return self.name
 
 
+_deleting = threading.local()
+
+
+def deleting_recipes():
+    if not hasattr(_deleting, 'ids'):
+        _deleting.ids = set()
+    return _deleting.ids
+
+
+@contextmanager
+def deleting(recipe_ids):
+    """
+    Рецепты удаляются вместе со связанными строками: построчные
+    обработчики сигналов для них пропускаются (recipes.signals). Отметка
+    снимается и при ошибке удаления.
+    """
+    added = set(recipe_ids) - deleting_recipes()
+    deleting_recipes().update(added)
+    try:
+        yield
+    finally:
+        deleting_recipes().difference_update(added)
+
+
+def is_being_deleted(recipe_id):
+    return recipe_id in deleting_recipes()
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для ленты."""
+
+    def delete(self):
+        with deleting(self.values_list('pk', flat=True)):
+            return super().delete()
+
+    def with_related(self):
+        """Автор, теги и ингредиенты без запроса на каждый рецепт."""
+        return self.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch('recipes', queryset=RecipeIngredient.objects
+                     .select_related('ingredient')),
+        )
+
+    def latest_by_author(self, author_ids, limit=None):
+        """Последние рецепты каждого автора одним оконным запросом."""
+        previews = {author_id: [] for author_id in author_ids}
+        if not previews:
+            return previews
+        if limit is None:
+            recipes = self.filter(author__in=author_ids)
+        else:
+            table = self.model._meta.db_table
+            placeholders = ', '.join(['%s'] * len(previews))
+            recipes = self.raw(
+                f'SELECT * FROM ('
+                f'SELECT {table}.*, ROW_NUMBER() OVER ('
+                f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+                f') AS preview_rank FROM {table} '
+                f'WHERE author_id IN ({placeholders})'
+                f') AS ranked WHERE preview_rank <= %s '
+                f'ORDER BY author_id, pub_date DESC, id DESC',
+                [*previews, limit]
+            )
+        for recipe in recipes:
+            previews[recipe.author_id].append(recipe)
+        return previews
+
+    def touch(self):
+        """Отмечает рецепты изменёнными, не вызывая save()."""
+        return self.update(updated_at=timezone.now())
+
+    def with_user_flags(self, user):
+        """Отметки «в избранном», «в корзине» и подписки на автора."""
+        if not user.is_authenticated:
+            return self.annotate(is_favorited=Value(False),
+                                 is_in_shopping_cart=Value(False),
+                                 author_is_subscribed=Value(False))
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -82,15 +181,77 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    # Меняется и при изменении тегов, ингредиентов и автора рецепта:
+    # по нему проверяются условные запросы (ETag, Last-Modified).
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах',
+        default=0,
+        editable=False
+    )
+    tag_mask = models.BigIntegerField(
+        'Битовая маска тегов',
+        default=0,
+        editable=False
+    )
+    # Только для PostgreSQL, GIN-индекс создаётся миграцией;
+    # на SQLite поиск идёт по FTS5-таблице recipes_recipe_fts.
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    # Бит тега — его id; старший бит знаковый, его не используем.
+    TAG_MASK_BITS = 63
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        with deleting([self.pk]):
+            return super().delete(*args, **kwargs)
+
+    @classmethod
+    def tags_fit_mask(cls, tag_ids):
+        return all(0 < pk < cls.TAG_MASK_BITS for pk in tag_ids)
+
+    @classmethod
+    def make_tag_mask(cls, tag_ids):
+        """Маска тегов; теги, не поместившиеся в маску, пропускаются."""
+        mask = 0
+        for pk in tag_ids:
+            if 0 < pk < cls.TAG_MASK_BITS:
+                mask |= 1 << pk
+        return mask
+
+    def refresh_tag_mask(self):
+        """Пересчитывает маску по сохранённым тегам рецепта."""
+        self.tag_mask = self.make_tag_mask(
+            self.recipe_tags.values_list('tag_id', flat=True))
+        Recipe.objects.filter(pk=self.pk).update(tag_mask=self.tag_mask)
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -144,6 +305,16 @@ class RecipeTags(models.Model):
     class Meta:
         verbose_name = "Теги"
         verbose_name_plural = "Теги"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'tag'],
+                name='unique_recipe_tag'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['tag', 'recipe'],
+                         name='recipetags_tag_recipe_idx'),
+        ]
 
     def __str__(self):
         return f"У рецепта {self.recipe} есть тег {self.tag}"
@@ -205,3 +376,202 @@ class ShoppingList(models.Model):
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
+
+
+class ShoppingListTotalQuerySet(models.QuerySet):
+    """Поддержка сводного списка покупок в актуальном состоянии."""
+
+    def apply(self, user_ids, deltas):
+        """
+        Прибавляет deltas {ингредиент: количество} к корзинам user_ids.
+
+        Недостающие строки сначала вставляются с нулём, конфликт с
+        параллельной вставкой пропускается (unique_shopping_total), затем
+        всё прибавляется одним UPDATE с F(): параллельные корзины того же
+        пользователя не теряют прибавки и не падают с IntegrityError.
+        """
+        user_ids = list(user_ids)
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic(savepoint=False):
+            self.bulk_create(
+                [self.model(user_id=user_id, ingredient_id=pk, amount=0)
+                 for user_id in user_ids
+                 for pk, delta in deltas.items() if delta > 0],
+                ignore_conflicts=True)
+            self.filter(
+                user_id__in=user_ids, ingredient_id__in=deltas,
+            ).update(amount=F('amount') + Case(
+                *[When(ingredient_id=pk, then=Value(delta))
+                  for pk, delta in deltas.items()],
+                default=Value(0)))
+            self.filter(user_id__in=user_ids, amount__lte=0).delete()
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        self.apply([user_id], {
+            pk: sign * amount for pk, amount
+            in RecipeIngredient.objects.filter(
+                recipe_id=recipe_id).values_list('ingredient_id', 'amount')})
+
+    def remove_recipe(self, user_id, recipe_id):
+        self.add_recipe(user_id, recipe_id, sign=-1)
+
+    def apply_to_carts(self, recipe_id, deltas):
+        """Прибавляет deltas к корзинам всех пользователей с рецептом."""
+        self.apply(ShoppingList.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True), deltas)
+
+    def expected(self):
+        """Суммы, посчитанные заново по корзинам и рецептам."""
+        return (
+            RecipeIngredient.objects
+            .filter(recipe__shopping_list__isnull=False)
+            .values('recipe__shopping_list__user', 'ingredient')
+            .annotate(total=models.Sum('amount'))
+            .order_by()
+            .values_list('recipe__shopping_list__user', 'ingredient',
+                         'total')
+        )
+
+
+class ShoppingListTotal(models.Model):
+    """Сколько каждого ингредиента нужно купить по всей корзине."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_totals',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_totals',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField('Количество')
+
+    objects = ShoppingListTotalQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Итог корзины'
+        verbose_name_plural = 'Итоги корзины'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_total'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.ingredient}: {self.amount}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика автора (раздача при публикации)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Читатель'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.recipe}'
+
+
+class SimilarRecipe(models.Model):
+    """Ближайший по составу и тегам рецепт (строит build_similarity)."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='similar_recipe_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}: {self.score:.3f}'
+
+
+class ReferenceVersion(models.Model):
+    """
+    Версия справочника (теги, ингредиенты), общая для всех процессов:
+    по ней сбрасываются кэши ответов и индексы в памяти воркеров.
+    """
+    name = models.CharField('Справочник', max_length=64, unique=True)
+    version = models.PositiveBigIntegerField('Версия', default=0)
+    changed_at = models.DateTimeField('Дата изменения', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
+class RecipeChange(models.Model):
+    """Изменение состава рецептов для индексов в памяти воркеров."""
+    recipe_ids = models.JSONField('Рецепты')
+    created_at = models.DateTimeField(
+        'Дата изменения',
+        default=timezone.now,
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Изменение рецептов'
+        verbose_name_plural = 'Изменения рецептов'
+
+    def __str__(self):
+        return f'{self.created_at}: {self.recipe_ids}'
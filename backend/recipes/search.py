@@ -0,0 +1,98 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from .models import Recipe, RecipeIngredient
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+# Веса полей в bm25: название, описание, ингредиенты.
+FTS_WEIGHTS = '10.0, 4.0, 1.0'
+BATCH_SIZE = 500
+
+
+def is_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+def ingredient_names():
+    from django.contrib.postgres.aggregates import StringAgg
+    return Coalesce(Subquery(
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk')).order_by()
+        .values('recipe').annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    ), Value(''))
+
+
+def update_search_index(recipe_ids):
+    """Пересчитывает поисковые данные рецептов после изменения."""
+    recipe_ids = list(recipe_ids)
+    if is_postgresql():
+        Recipe.objects.filter(pk__in=recipe_ids).update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+            + SearchVector(ingredient_names(), weight='C',
+                           config=SEARCH_CONFIG)))
+        return
+    recipes = Recipe._meta.db_table
+    lines = RecipeIngredient._meta.db_table
+    ingredients = RecipeIngredient._meta.get_field(
+        'ingredient').related_model._meta.db_table
+    with connection.cursor() as cursor:
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            batch = recipe_ids[start:start + BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                batch)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+                f'SELECT r.id, r.name, r.text, COALESCE(('
+                f'SELECT group_concat(i.name, \' \') FROM {lines} ri '
+                f'JOIN {ingredients} i ON i.id = ri.ingredient_id '
+                f'WHERE ri.recipe_id = r.id), \'\') '
+                f'FROM {recipes} r WHERE r.id IN ({placeholders})',
+                batch)
+
+
+def remove_from_search_index(recipe_ids):
+    if is_postgresql():
+        return
+    recipe_ids = list(recipe_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            batch = recipe_ids[start:start + BATCH_SIZE]
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+                f'({", ".join(["%s"] * len(batch))})', batch)
+
+
+def fts_query(text):
+    """Запрос FTS5: все слова, каждое как префикс (замена стемминга)."""
+    words = ''.join(
+        char if char.isalnum() else ' ' for char in text).split()
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, text):
+    """Рецепты, подходящие под запрос, с оценкой search_rank."""
+    if is_postgresql():
+        query = SearchQuery(text, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query))
+    match = fts_query(text)
+    if not match:
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())).none()
+    table = Recipe._meta.db_table
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,)
+    )).annotate(search_rank=RawSQL(
+        f'SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+        (match,), output_field=FloatField()))
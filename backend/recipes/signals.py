@@ -0,0 +1,205 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from users.models import Subscribe, User
+
+from . import feed
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     RecipeTags, ShoppingList, ShoppingListTotal, Tag,
+                     is_being_deleted)
+from .search import remove_from_search_index, update_search_index
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name', 'avatar'}
+
+_rewriting = threading.local()
+
+
+def rewriting_recipes():
+    if not hasattr(_rewriting, 'ids'):
+        _rewriting.ids = set()
+    return _rewriting.ids
+
+
+@contextmanager
+def rewriting(recipe_id):
+    """
+    Теги и ингредиенты рецепта заменяются целиком: поисковый индекс и
+    updated_at вызывающий обновит сам, один раз после записи.
+    """
+    rewriting_recipes().add(recipe_id)
+    try:
+        yield
+    finally:
+        rewriting_recipes().discard(recipe_id)
+
+
+def bump(model, pk, field, delta):
+    rows = model.objects.filter(pk=pk)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    rows.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        bump(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(sender, instance, **kwargs):
+    if not is_being_deleted(instance.recipe_id):
+        bump(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingList)
+def cart_item_added(sender, instance, created, **kwargs):
+    if created:
+        bump(Recipe, instance.recipe_id, 'in_carts_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingList)
+def cart_item_removed(sender, instance, **kwargs):
+    if not is_being_deleted(instance.recipe_id):
+        bump(Recipe, instance.recipe_id, 'in_carts_count', -1)
+
+
+# Итоги корзин (ShoppingListTotal) меняются вместе с корзинами и составом
+# рецептов на любом пути: API, админка, удаление через QuerySet.
+@receiver(post_save, sender=ShoppingList)
+def cart_total_added(sender, instance, created, **kwargs):
+    if created:
+        ShoppingListTotal.objects.add_recipe(
+            instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingList)
+def cart_total_removed(sender, instance, **kwargs):
+    if not is_being_deleted(instance.recipe_id):
+        ShoppingListTotal.objects.remove_recipe(
+            instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_leaving_carts(sender, instance, **kwargs):
+    """
+    Удаляемый рецепт уходит из всех корзин одним пересчётом. При каскаде
+    без Recipe.delete() (например, с автором) итоги ведут построчные
+    обработчики корзин и ингредиентов.
+    """
+    if not is_being_deleted(instance.pk):
+        return
+    ShoppingListTotal.objects.apply_to_carts(instance.pk, {
+        pk: -amount for pk, amount in RecipeIngredient.objects.filter(
+            recipe_id=instance.pk).values_list('ingredient_id', 'amount')})
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_saving(sender, instance, **kwargs):
+    # Прежняя строка: итоги корзин меняются на разницу.
+    instance.stored_line = None
+    if instance.pk is not None:
+        instance.stored_line = sender.objects.filter(
+            pk=instance.pk).values_list(
+                'recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    deltas = {}
+    stored = getattr(instance, 'stored_line', None)
+    if stored is not None:
+        recipe_id, ingredient_id, amount = stored
+        deltas.setdefault(recipe_id, {})[ingredient_id] = -amount
+    recipe_deltas = deltas.setdefault(instance.recipe_id, {})
+    recipe_deltas[instance.ingredient_id] = (
+        recipe_deltas.get(instance.ingredient_id, 0) + instance.amount)
+    for recipe_id, recipe_deltas in deltas.items():
+        if handles_items(recipe_id):
+            ShoppingListTotal.objects.apply_to_carts(recipe_id, recipe_deltas)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    if handles_items(instance.recipe_id):
+        ShoppingListTotal.objects.apply_to_carts(
+            instance.recipe_id, {instance.ingredient_id: -instance.amount})
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        bump(User, instance.author_id, 'recipes_count', 1)
+        transaction.on_commit(lambda: feed.fan_out([instance]))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    bump(User, instance.author_id, 'recipes_count', -1)
+
+
+def handles_items(recipe_id):
+    return not (is_being_deleted(recipe_id)
+                or recipe_id in rewriting_recipes())
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    if handles_items(instance.recipe_id):
+        update_search_index([instance.recipe_id])
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=RecipeTags)
+def recipe_items_changed(sender, instance, **kwargs):
+    if handles_items(instance.recipe_id):
+        Recipe.objects.filter(pk=instance.recipe_id).touch()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, **kwargs):
+    if not created:
+        recipe_ids = RecipeIngredient.objects.filter(
+            ingredient=instance).values_list('recipe_id', flat=True)
+        update_search_index(recipe_ids)
+        Recipe.objects.filter(pk__in=recipe_ids).touch()
+
+
+@receiver(post_save, sender=Tag)
+def tag_renamed(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(pk__in=RecipeTags.objects.filter(
+            tag=instance).values('recipe_id')).touch()
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Данные автора входят в ответы с его рецептами."""
+    if created or (update_fields is not None
+                   and not set(update_fields) & AUTHOR_FIELDS):
+        return
+    Recipe.objects.filter(author=instance).touch()
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed_from_search(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
+
+
+@receiver(post_save, sender=Subscribe)
+def subscribed(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def unsubscribed(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
+    # followers_count уже уменьшен обработчиком users.signals.
+    author_id = instance.author_id
+    transaction.on_commit(lambda: feed.restore(author_id))
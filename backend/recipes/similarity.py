@@ -0,0 +1,166 @@
+import heapq
+import math
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+
+from .models import RecipeIngredient, RecipeTags, SimilarRecipe
+
+CANDIDATES_PER_NEIGHBOUR = 20
+
+
+def features():
+    """
+    Признаки рецептов по возрастанию id: ингредиент i даёт признак 2i,
+    тег t — признак 2t + 1.
+    """
+    lines = RecipeIngredient.objects.order_by('recipe_id', 'ingredient_id')
+    tags = RecipeTags.objects.order_by('recipe_id', 'tag_id')
+    rows = heapq.merge(
+        ((recipe_id, 2 * pk) for recipe_id, pk in lines.values_list(
+            'recipe_id', 'ingredient_id').iterator()),
+        ((recipe_id, 2 * pk + 1) for recipe_id, pk in tags.values_list(
+            'recipe_id', 'tag_id').iterator()))
+    for recipe_id, items in groupby(rows, key=lambda row: row[0]):
+        yield recipe_id, array('Q', sorted({key for _, key in items}))
+
+
+class SimilarityMatrix:
+    """
+    Разреженная матрица «рецепт × признак» в компактных массивах:
+    строки (CSR) для весов рецепта и столбцы (CSC) для поиска соседей.
+
+    Признак весит log(N / df), теги дополнительно умножаются на
+    SIMILARITY_TAG_WEIGHT; сходство — косинус взвешенных векторов.
+    Кандидатов дают только признаки не чаще SIMILARITY_POSTING_LIMIT
+    рецептов: соль и «завтрак» есть почти везде и ничего не различают.
+    Вклад частых признаков в скалярное произведение лучших кандидатов
+    досчитывается бинарным поиском по их столбцам.
+    """
+
+    def __init__(self, rows):
+        self.ids = array('Q')
+        self.indptr = array('Q', [0])
+        self.indices = array('Q')
+        for recipe_id, keys in rows:
+            self.ids.append(recipe_id)
+            self.indices.extend(keys)
+            self.indptr.append(len(self.indices))
+        frequency = Counter(self.indices)
+        total = max(len(self.ids), 1)
+        self.weights = {
+            key: math.log(total / count) * (
+                settings.SIMILARITY_TAG_WEIGHT if key % 2 else 1)
+            for key, count in frequency.items()}
+        self.columns = {key: array('I') for key in frequency}
+        self.norms = array('d')
+        for row in range(len(self.ids)):
+            keys = self.row(row)
+            for key in keys:
+                self.columns[key].append(row)
+            self.norms.append(math.sqrt(
+                sum(self.weights[key] ** 2 for key in keys)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, row):
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def find(self, recipe_id):
+        row = bisect_left(self.ids, recipe_id)
+        if row < len(self.ids) and self.ids[row] == recipe_id:
+            return row
+        return None
+
+    def neighbours(self, row, count):
+        """count ближайших рецептов: [(id, сходство), ...]."""
+        if not self.norms[row]:
+            return []
+        limit = settings.SIMILARITY_POSTING_LIMIT
+        keys = sorted(self.row(row), key=lambda key: len(self.columns[key]))
+        rare = [key for key in keys if len(self.columns[key]) <= limit]
+        frequent = keys[len(rare):]
+        if not rare and frequent:
+            # Редких признаков нет: кандидаты — последние рецепты
+            # самого редкого из частых признаков.
+            seed = frequent.pop(0)
+            rare = [seed]
+        scores = {}
+        for key in rare:
+            weight = self.weights[key] ** 2
+            for other in self.columns[key][-limit:]:
+                scores[other] = scores.get(other, 0) + weight
+        scores.pop(row, None)
+        norms = self.norms
+        if len(scores) > count * CANDIDATES_PER_NEIGHBOUR:
+            # Частые признаки досчитываются только лучшим по редким.
+            scores = dict(heapq.nlargest(
+                count * CANDIDATES_PER_NEIGHBOUR, scores.items(),
+                key=lambda item: item[1] / (norms[item[0]] or 1)))
+        for key in frequent:
+            column = self.columns[key]
+            weight = self.weights[key] ** 2
+            for other in scores:
+                position = bisect_left(column, other)
+                if position < len(column) and column[position] == other:
+                    scores[other] += weight
+        norm = norms[row]
+        best = heapq.nlargest(
+            count, ((score / (norm * norms[other]), other)
+                    for other, score in scores.items() if norms[other]))
+        return [(self.ids[other], score) for score, other in best if score]
+
+
+def save_neighbours(matrix, rows, count):
+    """Перезаписывает соседей рецептов из строк rows одной транзакцией."""
+    found = {matrix.ids[row]: matrix.neighbours(row, count) for row in rows}
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=found).delete()
+        SimilarRecipe.objects.bulk_create(
+            [SimilarRecipe(recipe_id=recipe_id, similar_id=other,
+                           score=score)
+             for recipe_id, neighbours in found.items()
+             for other, score in neighbours])
+    return found
+
+
+def offer_neighbours(found, count):
+    """
+    Симметричное обновление: изменённый рецепт попадает в списки своих
+    соседей, если он ближе их худшего соседа.
+    """
+    offers = {}
+    for recipe_id, neighbours in found.items():
+        for other, score in neighbours:
+            if other not in found:
+                offers.setdefault(other, []).append((recipe_id, score))
+    if not offers:
+        return
+    current = SimilarRecipe.objects.filter(recipe_id__in=offers)
+    worst = dict(current.values('recipe_id').annotate(
+        worst=Min('score')).values_list('recipe_id', 'worst'))
+    sizes = Counter(current.values_list('recipe_id', flat=True))
+    with transaction.atomic():
+        for other, candidates in offers.items():
+            candidates = [(recipe_id, score) for recipe_id, score
+                          in candidates
+                          if sizes[other] < count
+                          or score > worst.get(other, 0)]
+            if not candidates:
+                continue
+            SimilarRecipe.objects.filter(
+                recipe_id=other,
+                similar_id__in=[pk for pk, _ in candidates]).delete()
+            SimilarRecipe.objects.bulk_create(
+                [SimilarRecipe(recipe_id=other, similar_id=recipe_id,
+                               score=score)
+                 for recipe_id, score in candidates])
+            stale = SimilarRecipe.objects.filter(recipe_id=other).order_by(
+                '-score').values_list('id', flat=True)[count:]
+            SimilarRecipe.objects.filter(id__in=list(stale)).delete()
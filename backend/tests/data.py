@@ -0,0 +1,71 @@
+from io import StringIO
+from types import SimpleNamespace
+
+from django.core.management import call_command
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTags, ShoppingList, Tag)
+from recipes.search import update_search_index
+from users.models import Subscribe, User
+
+
+def create_recipes(count, authors=5, tags=4, ingredients=12, lines=3):
+    """
+    Рецепты разных авторов с тегами и ингредиентами и читатель, у которого
+    в избранном каждый третий рецепт, в корзине — каждый четвёртый, а
+    подписки — на двух первых авторов.
+    """
+    reader = User.objects.create_user(
+        username='reader', email='reader@test.local', password='-')
+    User.objects.bulk_create(
+        [User(username=f'author_{i}', email=f'author{i}@test.local',
+              first_name='Имя', last_name=f'Фамилия {i}')
+         for i in range(authors)])
+    author_list = list(User.objects.filter(
+        username__startswith='author_').order_by('id'))
+    Tag.objects.bulk_create(
+        [Tag(name=f'Тег {i}', slug=f'tag-{i}') for i in range(tags)])
+    tag_list = list(Tag.objects.order_by('id'))
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+         for i in range(ingredients)])
+    ingredient_list = list(Ingredient.objects.order_by('id'))
+    recipe_tags = [[tag_list[i % tags], tag_list[(i + 1) % tags]]
+                   for i in range(count)]
+    Recipe.objects.bulk_create(
+        [Recipe(author=author_list[i % authors], name=f'Рецепт {i}',
+                text=f'Описание рецепта {i}.', cooking_time=5 + i,
+                image='recipes/test.png',
+                tag_mask=Recipe.make_tag_mask(
+                    tag.pk for tag in recipe_tags[i]))
+         for i in range(count)])
+    recipes = list(Recipe.objects.order_by('id'))
+    RecipeTags.objects.bulk_create(
+        [RecipeTags(recipe=recipe, tag=tag)
+         for recipe, chosen in zip(recipes, recipe_tags) for tag in chosen])
+    RecipeIngredient.objects.bulk_create(
+        [RecipeIngredient(
+            recipe=recipe,
+            ingredient=ingredient_list[(i + j) % ingredients],
+            amount=j + 1)
+         for i, recipe in enumerate(recipes) for j in range(lines)])
+    update_search_index(recipe.pk for recipe in recipes)
+    # Построчно: сигналы ведут счётчики, итоги корзин и ленту так же,
+    # как при работе через API.
+    for recipe in recipes[::3]:
+        Favorite.objects.create(user=reader, recipe=recipe)
+    for recipe in recipes[::4]:
+        ShoppingList.objects.create(user=reader, recipe=recipe)
+    for author in author_list[:2]:
+        Subscribe.objects.create(user=reader, author=author)
+    # Рецепты созданы bulk_create: recipes_count авторов без сигналов.
+    call_command('reconcile_counters', stdout=StringIO())
+    reader.refresh_from_db()
+    author_list = list(User.objects.filter(
+        username__startswith='author_').order_by('id'))
+    recipes = list(Recipe.objects.order_by('id'))
+    favorites = recipes[::3]
+    cart = recipes[::4]
+    return SimpleNamespace(
+        reader=reader, authors=author_list, tags=tag_list,
+        ingredients=ingredient_list, recipes=recipes,
+        favorites=favorites, cart=cart)
@@ -0,0 +1,33 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from users.models import User
+
+from .data import create_recipes
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+class RecipeListStampTest(TestCase):
+    """Время изменения списка рецептов сдвигают только данные рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_recipes(3)
+        cls.author = cls.data.authors[0]
+        cls.author.set_password('Password-1')
+        cls.author.save()
+
+    def test_login(self):
+        with mock.patch('api.recipes.conditional.recipes_changed') as changed:
+            response = APIClient().post('/api/auth/token/login/', {
+                'email': self.author.email, 'password': 'Password-1'})
+        self.assertEqual(response.status_code, 200, response.content)
+        changed.assert_not_called()
+
+    def test_author_changed(self):
+        author = User.objects.get(pk=self.author.pk)
+        with mock.patch('api.recipes.conditional.recipes_changed') as changed:
+            author.first_name = 'Другое'
+            author.save(update_fields=['first_name'])
+        changed.assert_called_once_with()
@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.test import TestCase
+from recipes.models import (Favorite, Recipe, RecipeTags, ShoppingListTotal,
+                            is_being_deleted)
+
+from .data import create_recipes
+
+
+class Failure(Exception):
+    pass
+
+
+def fail(sender, **kwargs):
+    raise Failure
+
+
+class RecipeDeleteTest(TestCase):
+    """Удаление рецептов и денормализованные счётчики."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_recipes(12)
+
+    def test_failed_delete(self):
+        recipe = self.data.favorites[0]
+        post_delete.connect(fail, sender=RecipeTags)
+        try:
+            with self.assertRaises(Failure), transaction.atomic():
+                recipe.delete()
+        finally:
+            post_delete.disconnect(fail, sender=RecipeTags)
+        self.assertFalse(is_being_deleted(recipe.pk))
+        Favorite.objects.filter(recipe=recipe).delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+
+    def test_author_cascade(self):
+        author = self.data.cart[0].author
+        author.delete()
+        self.assertFalse(Recipe.objects.filter(author=author).exists())
+        expected = {(user_id, ingredient_id): total
+                    for user_id, ingredient_id, total
+                    in ShoppingListTotal.objects.expected()}
+        self.assertEqual(expected, {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingListTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'amount')})
@@ -0,0 +1,51 @@
+import json
+
+from api.recipes.fast_read import recipe_rows, recipe_values
+from api.recipes.serializers import RecipeReadSerializer
+from api.renderers import FastJSONRenderer
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase
+from recipes.models import Recipe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+from .data import create_recipes
+
+
+class FastReadGoldenTest(TestCase):
+    """
+    Быстрый путь чтения рецептов (строки values() и FastJSONRenderer)
+    отдаёт тот же JSON, что и RecipeReadSerializer с JSONRenderer.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_recipes(20)
+        User.objects.filter(pk=cls.data.authors[0].pk).update(
+            avatar='users/test.png')
+
+    def assert_same(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/recipes/'))
+        request.user = user
+        queryset = Recipe.objects.order_by('-pub_date')
+        expected = JSONRenderer().render(RecipeReadSerializer(
+            queryset.with_related().with_user_flags(user), many=True,
+            context={'request': request}).data)
+        actual = FastJSONRenderer().render(
+            recipe_rows(recipe_values(queryset, user), request))
+        self.assertEqual(json.loads(actual), json.loads(expected))
+        return json.loads(actual)
+
+    def test_authenticated(self):
+        results = self.assert_same(self.data.reader)
+        self.assertEqual(len(results), len(self.data.recipes))
+        self.assertTrue(any(row['is_favorited'] for row in results))
+        self.assertTrue(any(row['is_in_shopping_cart'] for row in results))
+        self.assertTrue(any(row['author']['is_subscribed']
+                            for row in results))
+        self.assertTrue(any(row['author']['avatar'] for row in results))
+
+    def test_anonymous(self):
+        self.assert_same(AnonymousUser())
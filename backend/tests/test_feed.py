@@ -0,0 +1,36 @@
+from django.test import TestCase, override_settings
+from recipes.feed import timeline
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscribe, User
+
+
+@override_settings(FEED_FANOUT_LIMIT=2)
+class FeedFanoutLimitTest(TestCase):
+    """Автор пересекает FEED_FANOUT_LIMIT в обе стороны."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@test.local', password='-')
+        cls.followers = [User.objects.create_user(
+            username=f'follower_{i}', email=f'follower{i}@test.local',
+            password='-') for i in range(3)]
+
+    def feed(self, user):
+        return timeline(user, limit=100)
+
+    def test_back_under_limit(self):
+        for follower in self.followers:
+            Subscribe.objects.create(user=follower, author=self.author)
+        # Подписчиков больше лимита: рецепты не раздаются, а читаются.
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.author, name='Рецепт', text='Описание.',
+                cooking_time=5)
+        self.assertFalse(FeedEntry.objects.filter(recipe=recipe).exists())
+        self.assertEqual(self.feed(self.followers[2]), [recipe.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscribe.objects.filter(user=self.followers[0]).delete()
+        for follower in self.followers[1:]:
+            self.assertEqual(self.feed(follower), [recipe.pk])
+        self.assertEqual(self.feed(self.followers[0]), [])
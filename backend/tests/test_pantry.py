@@ -0,0 +1,32 @@
+from api.pantry import build_pantry_index, catch_up
+from django.test import TestCase, override_settings
+from recipes.models import RecipeIngredient
+
+from .data import create_recipes
+
+
+@override_settings(PANTRY_JOURNAL_SETTLE=0)
+class PantryCatchUpTest(TestCase):
+    """Журнал изменений применяется к копии индекса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_recipes(8, ingredients=20)
+
+    def found(self, index, ingredient):
+        return {pk for pk, _ in index.search([ingredient.pk])[:100]}
+
+    def test_catch_up(self):
+        index = build_pantry_index()
+        recipe = self.data.recipes[0]
+        ingredient = self.data.ingredients[-1]
+        self.assertNotIn(recipe.pk, self.found(index, ingredient))
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1)
+        updated = catch_up(index)
+        self.assertIsNot(updated, index)
+        self.assertIn(recipe.pk, self.found(updated, ingredient))
+        self.assertNotIn(recipe.pk, self.found(index, ingredient))
+        self.assertGreater(updated.sequence, index.sequence)
+        self.assertIs(catch_up(updated), updated)
@@ -0,0 +1,46 @@
+from io import StringIO
+from unittest import mock
+
+from api.budgets import QueryBudgetExceeded
+from api.recipes.views import RecipeViewSet
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .data import create_recipes
+
+
+class QueryBudgetsTest(TestCase):
+    """Бюджеты SQL всех адресов API (команда check_query_budgets)."""
+
+    def test_endpoints(self):
+        stderr = StringIO()
+        try:
+            call_command('check_query_budgets', stdout=StringIO(),
+                         stderr=stderr)
+        except CommandError as error:
+            self.fail(f'{error}\n{stderr.getvalue()}')
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=0, QUERY_BUDGET_MODE='strict')
+class QueryBudgetMiddlewareTest(TestCase):
+    """В режиме strict превышение бюджета завершает запрос ошибкой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_recipes(10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.data.reader)
+
+    def test_within_budget(self):
+        response = self.client.get('/api/recipes/recipes/', {'limit': 6})
+        self.assertEqual(response.status_code, 200)
+
+    def test_exceeded(self):
+        with mock.patch.object(RecipeViewSet, 'query_budget', {'list': 1}):
+            with self.assertRaisesMessage(QueryBudgetExceeded,
+                                          'RecipeViewSet.list'):
+                self.client.get('/api/recipes/recipes/', {'limit': 6})
@@ -0,0 +1,113 @@
+from unittest import skipUnless
+
+from api.filters import RecipeFilter
+from django.db import connection
+from django.test import TestCase, override_settings
+from recipes.models import Recipe, RecipeTags, Tag
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .data import create_recipes
+
+URL = '/api/recipes/recipes/'
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+class RecipeFilterTest(TestCase):
+    """Фильтры списка рецептов: состав выдачи и отсутствие дублей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_recipes(40)
+        # id за пределами битовой маски: фильтр идёт через EXISTS.
+        cls.wide_tag = Tag.objects.create(
+            pk=Recipe.TAG_MASK_BITS + 10, name='Широкий', slug='wide')
+        RecipeTags.objects.bulk_create(
+            [RecipeTags(recipe=recipe, tag=cls.wide_tag)
+             for recipe in cls.data.recipes[::5]])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.data.reader)
+
+    def get_ids(self, **params):
+        response = self.client.get(URL, {'limit': 1000, **params})
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.json()['results']]
+        self.assertEqual(len(ids), len(set(ids)), 'рецепты повторяются')
+        return ids
+
+    def with_tags(self, *tags):
+        return {recipe.pk for recipe in self.data.recipes
+                if set(recipe.tags.all()) & set(tags)}
+
+    def test_several_matching_tags(self):
+        first, second = self.data.tags[:2]
+        ids = self.get_ids(tags=[first.slug, second.slug])
+        self.assertEqual(set(ids), self.with_tags(first, second))
+
+    def test_tag_outside_mask(self):
+        first = self.data.tags[0]
+        ids = self.get_ids(tags=[first.slug, self.wide_tag.slug])
+        self.assertEqual(set(ids), self.with_tags(first, self.wide_tag))
+
+    def test_is_favorited(self):
+        self.assertEqual(set(self.get_ids(is_favorited=1)),
+                         {recipe.pk for recipe in self.data.favorites})
+
+    def test_is_in_shopping_cart(self):
+        self.assertEqual(set(self.get_ids(is_in_shopping_cart=1)),
+                         {recipe.pk for recipe in self.data.cart})
+
+    def test_combined(self):
+        tag = self.data.tags[0]
+        author = self.data.authors[0]
+        ids = self.get_ids(tags=[tag.slug], is_favorited=1,
+                           author=author.pk)
+        self.assertEqual(set(ids), {
+            recipe.pk for recipe in self.data.favorites
+            if recipe.author_id == author.pk
+            and recipe.pk in self.with_tags(tag)})
+
+    def test_flags_ignored_for_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(len(self.get_ids(is_favorited=1)),
+                         len(self.data.recipes))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN для PostgreSQL')
+class RecipeFilterPlanTest(TestCase):
+    """
+    Фильтры доступны по индексам: с запрещённым последовательным
+    чтением в плане не должно остаться Seq Scan по их таблицам.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_recipes(40)
+        cls.wide_tag = Tag.objects.create(
+            pk=Recipe.TAG_MASK_BITS + 10, name='Широкий', slug='wide')
+
+    def plan(self, **params):
+        request = APIRequestFactory().get(URL, params)
+        request.user = self.data.reader
+        queryset = RecipeFilter(
+            params, queryset=Recipe.objects.all(), request=request).qs
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_is_favorited(self):
+        self.assertNotIn('Seq Scan on recipes_favorite',
+                         self.plan(is_favorited='1'))
+
+    def test_is_in_shopping_cart(self):
+        self.assertNotIn('Seq Scan on recipes_shoppinglist',
+                         self.plan(is_in_shopping_cart='1'))
+
+    def test_tags_outside_mask(self):
+        self.assertNotIn('Seq Scan on recipes_recipetags',
+                         self.plan(tags=self.wide_tag.slug))
+
+    def test_author(self):
+        self.assertNotIn('Seq Scan on recipes_recipe',
+                         self.plan(author=str(self.data.authors[0].pk)))
@@ -0,0 +1,51 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .data import create_recipes
+
+URL = '/api/recipes/recipes/'
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+class RecipeListQueriesTest(TestCase):
+    """
+    Список рецептов: число SQL не зависит от размера страницы — COUNT,
+    рецепты с автором и отметками пользователя, теги и ингредиенты.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_recipes(120)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.data.reader)
+
+    def assert_page(self, limit):
+        for fast_read in (True, False):
+            with self.subTest(fast_read=fast_read), override_settings(
+                    RECIPE_FAST_READ=fast_read), self.assertNumQueries(4):
+                response = self.client.get(URL, {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            results = response.json()['results']
+            self.assertEqual(len(results), limit)
+            favorites = {recipe.pk for recipe in self.data.favorites}
+            cart = {recipe.pk for recipe in self.data.cart}
+            for recipe in results:
+                self.assertEqual(recipe['is_favorited'],
+                                 recipe['id'] in favorites)
+                self.assertEqual(recipe['is_in_shopping_cart'],
+                                 recipe['id'] in cart)
+
+    def test_limit_6(self):
+        self.assert_page(6)
+
+    def test_limit_100(self):
+        self.assert_page(100)
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        with self.assertNumQueries(4):
+            response = self.client.get(URL, {'limit': 100})
+        self.assertFalse(any(recipe['is_favorited']
+                             for recipe in response.json()['results']))
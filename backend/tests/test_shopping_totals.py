@@ -0,0 +1,77 @@
+from django.test import TestCase, override_settings
+from recipes.models import (Recipe, RecipeIngredient, ShoppingList,
+                            ShoppingListTotal)
+from rest_framework.test import APIClient
+
+from .data import create_recipes
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+class ShoppingTotalsTest(TestCase):
+    """
+    Итоги корзин совпадают с пересчётом по корзинам на любом пути
+    изменения: API, сохранение и удаление моделей, удаление QuerySet.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_recipes(12)
+
+    def assert_totals(self):
+        expected = {(user_id, ingredient_id): total
+                    for user_id, ingredient_id, total
+                    in ShoppingListTotal.objects.expected()}
+        stored = {(user_id, ingredient_id): amount
+                  for user_id, ingredient_id, amount
+                  in ShoppingListTotal.objects.values_list(
+                      'user_id', 'ingredient_id', 'amount')}
+        self.assertEqual(stored, expected)
+
+    def test_fixture(self):
+        self.assertTrue(ShoppingListTotal.objects.exists())
+        self.assert_totals()
+
+    def test_cart_rows(self):
+        reader = self.data.reader
+        ShoppingList.objects.create(user=reader, recipe=self.data.recipes[1])
+        self.assert_totals()
+        ShoppingList.objects.filter(user=reader).delete()
+        self.assert_totals()
+        self.assertFalse(ShoppingListTotal.objects.exists())
+
+    def test_recipe_lines(self):
+        recipe = self.data.cart[0]
+        line = recipe.recipes.first()
+        line.amount += 5
+        line.save()
+        self.assert_totals()
+        line.ingredient = self.data.ingredients[-1]
+        line.save()
+        self.assert_totals()
+        line.delete()
+        self.assert_totals()
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=self.data.ingredients[5], amount=7)
+        self.assert_totals()
+
+    def test_recipe_delete(self):
+        self.data.cart[0].delete()
+        self.assert_totals()
+        Recipe.objects.filter(pk__in=[recipe.pk for recipe
+                                      in self.data.cart[1:]]).delete()
+        self.assert_totals()
+
+    def test_api_update(self):
+        recipe = self.data.cart[0]
+        client = APIClient()
+        client.force_authenticate(recipe.author)
+        response = client.patch(
+            f'/api/recipes/recipes/{recipe.pk}/', {
+                'ingredients': [
+                    {'id': self.data.ingredients[0].pk, 'amount': 3},
+                    {'id': self.data.ingredients[9].pk, 'amount': 4}],
+                'tags': [self.data.tags[0].pk], 'name': recipe.name,
+                'text': recipe.text, 'cooking_time': recipe.cooking_time},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assert_totals()
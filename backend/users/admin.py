@@ -7,6 +7,7 @@ from . import models
 class UserAdmin(admin.ModelAdmin):
     list_display = (
         'username', 'pk', 'email', 'password', 'first_name', 'last_name',
+        'recipes_count', 'followers_count',
     )
     list_editable = ('password', )
     list_filter = ('username', 'email')